@@ -1,5 +1,21 @@
 const WS_SERVER_PORTS = [3101, 3202, 3303, 3404, 3505];
 const CONNECTION_CODE = "EKSTENSI_FIREFOX_1234";
+const DEFAULT_SERVER_HOST = "127.0.0.1";
+const OUTBOX_LIMIT = 500;
+const MAX_UNACKED = 50;
+const ACK_TIMEOUT_MS = 30000;
+const RESULT_TIMEOUT_MS = 300000;
+const MIN_BACKOFF_MS = 1000;
+const MAX_BACKOFF_MS = 30000;
+const SENT_CACHE_SIZE = 1000;
+const NAVIGATION_DEBOUNCE_MS = 750;
+const YOUTUBE_URL_PATTERNS = [
+  "*://*.youtube.com/watch?v*",
+  "*://youtube.com/watch?v*",
+  "*://*.youtube.com/shorts/*",
+  "*://youtu.be/*"
+];
+const VIDEO_ID_PATTERN = /^[A-Za-z0-9_-]{11}$/;
 
 let socket = null;
 let socketConnected = false;
@@ -7,6 +23,18 @@ let socketConnecting = false;
 let connectedPort = null;
 let enabled = true; 
 let portIndex = 0;
+let serverHost = DEFAULT_SERVER_HOST;
+let connectionCode = CONNECTION_CODE;
+let outbox = [];
+let awaiting = new Map();
+let accepted = new Map();
+let throttleUntil = 0;
+let backoffMs = MIN_BACKOFF_MS;
+let flushTimer = null;
+let flushAt = 0;
+let nextId = 0;
+let sentVideos = new Map();
+let navigationTimers = new Map();
 
 function isConnected() {
   return socketConnected && socket && socket.readyState === WebSocket.OPEN;
@@ -62,14 +90,17 @@ function connectToServer(callback) {
     const port = WS_SERVER_PORTS[portIndex++];
     console.log("▶ Trying WebSocket port", port);
     cleanupSocket();
-    socket = new WebSocket(`ws://127.0.0.1:${port}`);
+    socket = new WebSocket(`ws://${serverHost}:${port}`);
     socket.onopen = () => {
       socketConnected = true;
       socketConnecting = false;
       connectedPort = port;
-      portIndex = 0; // reset for next time
+      portIndex = WS_SERVER_PORTS.indexOf(port); // retry this port first after a drop
       console.log(`✅ Connected on port ${port}`);
-      socket.send(CONNECTION_CODE);
+      socket.send(connectionCode);
+      awaiting.clear();
+      accepted.clear();
+      scheduleFlush(0);
       setTimeout(sendAllYouTubeTabs, 3000);
       if (callback) callback();
     };
@@ -84,59 +115,237 @@ function connectToServer(callback) {
     socket.onmessage = (ev) => {
       if (ev.data === "PING") {
         socket.send("PONG");
+        return;
       }
+      handleServerMessage(ev.data);
     };
   }
   tryNextPort();
 }
 
-function sendUrl(url) {
-  if (typeof url !== "string" || !url) {
-    console.warn("sendUrl: invalid URL", url);
+function saveOutbox() {
+  chrome.storage.local.set({ outbox });
+}
+
+function scheduleFlush(delay) {
+  const at = Date.now() + delay;
+  if (flushTimer) {
+    if (flushAt <= at) return;
+    clearTimeout(flushTimer);
+  }
+  flushAt = at;
+  flushTimer = setTimeout(() => {
+    flushTimer = null;
+    flushOutbox();
+  }, delay);
+}
+
+function flushOutbox() {
+  if (!enabled || !isConnected()) return;
+  const now = Date.now();
+  if (now < throttleUntil) {
+    scheduleFlush(throttleUntil - now);
     return;
   }
-  if (!enabled) {
-    console.log("sendUrl: disabled, skip", url);
+  let nextExpiry = Infinity;
+  for (const [id, sentAt] of awaiting) {
+    if (now - sentAt > ACK_TIMEOUT_MS) awaiting.delete(id);
+    else nextExpiry = Math.min(nextExpiry, sentAt + ACK_TIMEOUT_MS);
+  }
+  for (const [id, acceptedAt] of accepted) {
+    if (now - acceptedAt > RESULT_TIMEOUT_MS) accepted.delete(id);
+    else nextExpiry = Math.min(nextExpiry, acceptedAt + RESULT_TIMEOUT_MS);
+  }
+  if (nextExpiry !== Infinity) scheduleFlush(nextExpiry - now + 1);
+  const room = MAX_UNACKED - awaiting.size;
+  if (room <= 0) return;
+  const batch = outbox.filter(entry => !awaiting.has(entry.id) && !accepted.has(entry.id)).slice(0, room);
+  if (!batch.length) return;
+  const payload = batch.length === 1
+    ? { id: batch[0].id, url: batch[0].url }
+    : { urls: batch.map(entry => ({ id: entry.id, url: entry.url })) };
+  try {
+    socket.send(JSON.stringify(payload));
+  } catch (e) {
+    console.warn("Error sending URLs:", e);
     return;
   }
-  const payload = JSON.stringify({ url });
-  const doSend = () => {
-    if (isConnected()) {
-      try {
-        socket.send(payload);
-        console.log("✉️ Sent URL:", url);
-      } catch (e) {
-        console.warn("Error sending URL:", e);
-      }
+  batch.forEach(entry => awaiting.set(entry.id, now));
+  scheduleFlush(ACK_TIMEOUT_MS + 1);
+  console.log(`✉️ Sent ${batch.length} URL(s), ${outbox.length} in outbox`);
+}
+
+function settle(id) {
+  awaiting.delete(id);
+  accepted.delete(id);
+  const before = outbox.length;
+  outbox = outbox.filter(entry => entry.id !== id);
+  if (outbox.length !== before) saveOutbox();
+}
+
+function handleAck(id, status) {
+  awaiting.delete(id);
+  if (status === "queued") {
+    accepted.set(id, Date.now());
+  } else {
+    settle(id);
+  }
+}
+
+function updateFlow(msg) {
+  if (msg.saturated) {
+    throttleUntil = Date.now() + backoffMs;
+    console.log(`⏳ Server saturated (queue ${msg.queue_depth}/${msg.queue_capacity}), pausing ${backoffMs} ms`);
+    backoffMs = Math.min(backoffMs * 2, MAX_BACKOFF_MS);
+  } else if (msg.queue_depth !== undefined) {
+    throttleUntil = 0;
+    backoffMs = MIN_BACKOFF_MS;
+  }
+  scheduleFlush(0);
+}
+
+function handleServerMessage(data) {
+  let msg;
+  try {
+    msg = JSON.parse(data);
+  } catch (e) {
+    return;
+  }
+  if (msg.type === "ack") {
+    handleAck(msg.id, msg.status);
+    updateFlow(msg);
+  } else if (msg.type === "result") {
+    console.log(`📝 ${msg.status} ${msg.classification || ""} (${msg.id})`);
+    if (msg.status === "error") {
+      accepted.delete(msg.id);
+      awaiting.set(msg.id, Date.now());
     } else {
-      console.warn("sendUrl: socket not connected");
+      settle(msg.id);
     }
-  };
+    updateFlow(msg);
+  } else if (msg.type === "batch_summary") {
+    console.log(`📦 Batch ack: ${msg.queued} queued, ${msg.in_flight} in flight, ${msg.known} known, ${msg.invalid} invalid`);
+    (msg.acks || []).forEach(ack => handleAck(ack.id, ack.status));
+    updateFlow(msg);
+  } else if (msg.message) {
+    console.log("ℹ️ Server:", msg.message);
+  }
+}
+
+function enqueueUrls(urls) {
+  if (!enabled) {
+    console.log("enqueueUrls: disabled, skip", urls.length);
+    return;
+  }
+  const pending = new Set(outbox.map(entry => entry.url));
+  urls.forEach(url => {
+    if (pending.has(url)) return;
+    pending.add(url);
+    outbox.push({ id: `${Date.now().toString(36)}-${nextId++}`, url });
+  });
+  if (outbox.length > OUTBOX_LIMIT) {
+    const dropped = outbox.splice(0, outbox.length - OUTBOX_LIMIT);
+    dropped.forEach(entry => {
+      awaiting.delete(entry.id);
+      accepted.delete(entry.id);
+      sentVideos.delete(getVideoId(entry.url));
+    });
+    console.warn(`Outbox full, dropped ${dropped.length} oldest URL(s)`);
+  }
+  saveOutbox();
   if (!isConnected()) {
-    console.log("sendUrl: reconnecting first for", url);
-    connectToServer(() => setTimeout(doSend, 200));
+    connectToServer();
   } else {
-    doSend();
+    scheduleFlush(0);
+  }
+}
+
+function sendUrl(url) {
+  if (typeof url !== "string" || !url) {
+    console.warn("sendUrl: invalid URL", url);
+    return;
+  }
+  enqueueUrls([url]);
+}
+
+function sendUrls(urls) {
+  urls = urls.filter(url => typeof url === "string" && url);
+  if (urls.length) enqueueUrls(urls);
+}
+
+function getVideoId(url) {
+  let parsed;
+  try {
+    parsed = new URL(url);
+  } catch (e) {
+    return null;
+  }
+  let id = null;
+  if (parsed.hostname === "youtu.be") {
+    id = parsed.pathname.slice(1);
+  } else if (parsed.hostname === "youtube.com" || parsed.hostname.endsWith(".youtube.com")) {
+    if (parsed.pathname === "/watch") {
+      id = parsed.searchParams.get("v");
+    } else if (parsed.pathname.startsWith("/shorts/")) {
+      id = parsed.pathname.split("/")[2];
+    }
   }
+  return id && VIDEO_ID_PATTERN.test(id) ? id : null;
+}
+
+function markSent(videoId) {
+  if (sentVideos.has(videoId)) {
+    sentVideos.delete(videoId);
+    sentVideos.set(videoId, true);
+    return false;
+  }
+  sentVideos.set(videoId, true);
+  if (sentVideos.size > SENT_CACHE_SIZE) {
+    sentVideos.delete(sentVideos.keys().next().value);
+  }
+  return true;
+}
+
+function sendNewVideos(urls) {
+  if (!enabled) return;
+  sendUrls(urls.filter(url => {
+    const videoId = getVideoId(url);
+    return videoId && markSent(videoId);
+  }));
+}
+
+function onTabNavigated(tabId, url) {
+  if (!enabled || !getVideoId(url)) return;
+  clearTimeout(navigationTimers.get(tabId));
+  navigationTimers.set(tabId, setTimeout(() => {
+    navigationTimers.delete(tabId);
+    sendNewVideos([url]);
+  }, NAVIGATION_DEBOUNCE_MS));
 }
 
 function sendAllYouTubeTabs() {
-  chrome.tabs.query({ 
-    url: [
-      "*://*.youtube.com/watch?v*",
-      "*://youtube.com/watch?v*",
-      "*://m.youtube.com/watch?v*",
-      "*://youtu.be/*"
-    ] 
-  }, (tabs) => {
-    tabs.forEach(tab => {
-      if (tab.url) sendUrl(tab.url);
-    });
+  chrome.tabs.query({ url: YOUTUBE_URL_PATTERNS }, (tabs) => {
+    sendNewVideos(tabs.map(tab => tab.url));
   });
 }
 
-chrome.runtime.onMessage.addListener((req, sender) => {
-  if (req.url) sendUrl(req.url);
+function onTabUpdated(tabId, changeInfo) {
+  if (changeInfo.url) onTabNavigated(tabId, changeInfo.url);
+}
+
+try {
+  chrome.tabs.onUpdated.addListener(onTabUpdated, { urls: YOUTUBE_URL_PATTERNS, properties: ["url"] });
+} catch (e) {
+  chrome.tabs.onUpdated.addListener(onTabUpdated);
+}
+
+chrome.webNavigation.onHistoryStateUpdated.addListener(details => {
+  if (details.frameId === 0) onTabNavigated(details.tabId, details.url);
+}, { url: [{ hostSuffix: "youtube.com" }] });
+
+chrome.tabs.onRemoved.addListener(tabId => {
+  clearTimeout(navigationTimers.get(tabId));
+  navigationTimers.delete(tabId);
 });
 
 chrome.runtime.onStartup.addListener(() => {
@@ -154,9 +363,20 @@ chrome.storage.onChanged.addListener((changes, area) => {
       connectToServer();
     }
   }
+  if (area === "local" && (changes.serverHost || changes.connectionCode)) {
+    if (changes.serverHost) serverHost = changes.serverHost.newValue || DEFAULT_SERVER_HOST;
+    if (changes.connectionCode) connectionCode = changes.connectionCode.newValue || CONNECTION_CODE;
+    console.log(`🔁 Server settings changed - reconnecting to ${serverHost}`);
+    cleanupSocket();
+    connectToServer();
+  }
 });
 
-chrome.storage.local.get(["enabled"], res => {
+chrome.storage.local.get(["enabled", "outbox", "serverHost", "connectionCode"], res => {
   enabled = res.enabled !== false;
+  serverHost = res.serverHost || DEFAULT_SERVER_HOST;
+  connectionCode = res.connectionCode || CONNECTION_CODE;
+  const known = new Set(outbox.map(entry => entry.url));
+  outbox = (res.outbox || []).filter(entry => !known.has(entry.url)).concat(outbox);
   if (enabled) connectToServer();
 });
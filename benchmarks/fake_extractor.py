@@ -0,0 +1,66 @@
+import copy
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+FIXTURES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "metadata.json")
+class DownloadError(Exception):
+    pass
+def load_fixtures(path=FIXTURES_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    if not fixtures:
+        raise ValueError(f"No metadata fixtures in {path}")
+    return fixtures
+def video_id_of(url):
+    parsed = urlparse(url)
+    v = parse_qs(parsed.query).get("v")
+    return v[0] if v else parsed.path.rstrip("/").rsplit("/", 1)[-1]
+class FakeExtractor:
+    def __init__(self, latency=0.05, jitter=0.5, failure_rate=0.0, fixtures=None, seed=1, error_cls=DownloadError):
+        self.error_cls = error_cls
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.fixtures = fixtures if fixtures is not None else load_fixtures()
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.instances = 0
+    def __call__(self, opts=None):
+        with self.lock:
+            self.instances += 1
+        return FakeYoutubeDL(self, opts)
+    def extract(self, url):
+        video_id = video_id_of(url)
+        rng = random.Random(f"{self.seed}:{video_id}")
+        delay = self.latency * (1 + self.jitter * (2 * rng.random() - 1))
+        failed = rng.random() < self.failure_rate
+        fixture = self.fixtures[rng.randrange(len(self.fixtures))]
+        with self.lock:
+            self.calls += 1
+            self.failures += failed
+        time.sleep(max(delay, 0))
+        if failed:
+            raise self.error_cls(f"ERROR: [youtube] {video_id}: Video unavailable")
+        info = copy.deepcopy(fixture)
+        info["id"] = video_id
+        info["webpage_url"] = f"https://www.youtube.com/watch?v={video_id}"
+        return info
+class FakeYoutubeDL:
+    def __init__(self, extractor, opts=None):
+        self.extractor = extractor
+        self.params = dict(opts or {})
+    def extract_info(self, url, download=False):
+        return self.extractor.extract(url)
+    def sanitize_info(self, info):
+        return info
+    def close(self):
+        pass
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+try:
+    import resource
+except ImportError:
+    resource = None
+from fake_extractor import FIXTURES_FILE, FakeExtractor, load_fixtures
+from ydl_pool import load_server
+import websockets
+ID_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-"
+ID_LAST_CHARS = "AEIMQUYcgkosw048"
+URL_FORMS = [
+    "https://www.youtube.com/watch?v={id}",
+    "https://www.youtube.com/watch?v={id}&t=42s",
+    "https://youtu.be/{id}",
+    "https://m.youtube.com/watch?v={id}&list=PLbench",
+    "https://www.youtube.com/shorts/{id}",
+]
+RECENT_WINDOW = 200
+def build_stream(count, duplicate_ratio, seed):
+    rng = random.Random(seed)
+    video_ids = []
+    stream = []
+    for i in range(count):
+        if video_ids and rng.random() < duplicate_ratio:
+            video_id = rng.choice(video_ids[-RECENT_WINDOW:])
+        else:
+            video_id = "".join(rng.choices(ID_ALPHABET, k=10)) + rng.choice(ID_LAST_CHARS)
+            video_ids.append(video_id)
+        stream.append((str(i), rng.choice(URL_FORMS).format(id=video_id)))
+    return stream, len(video_ids)
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+def summarize_ms(seconds):
+    if not seconds:
+        return {"p50": None, "p99": None, "max": None}
+    return {
+        "p50": round(percentile(seconds, 50) * 1000, 3),
+        "p99": round(percentile(seconds, 99) * 1000, 3),
+        "max": round(max(seconds) * 1000, 3),
+    }
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+async def probe_loop_lag(samples, interval):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(time.perf_counter() - started - interval, 0))
+async def replay(url, code, stream, args, stats):
+    sent = {}
+    remaining = len(stream)
+    done = asyncio.Event()
+    flow = asyncio.Event()
+    flow.set()
+    def settle(request_id):
+        nonlocal remaining
+        if sent.pop(request_id, None) is None:
+            return
+        remaining -= 1
+        if remaining == 0:
+            stats["finished"] = time.perf_counter()
+            done.set()
+    def handle_ack(request_id, status, now):
+        stats["statuses"][status] += 1
+        if request_id in sent:
+            stats["ack_latency"].append(now - sent[request_id])
+        if status != "queued":
+            settle(request_id)
+    async def receive(websocket):
+        async for message in websocket:
+            now = time.perf_counter()
+            data = json.loads(message)
+            if "saturated" in data:
+                stats["saturated"] += bool(data["saturated"])
+                if data["saturated"]:
+                    flow.clear()
+                else:
+                    flow.set()
+            kind = data.get("type")
+            if kind == "ack":
+                handle_ack(data["id"], data["status"], now)
+            elif kind == "batch_summary":
+                for ack in data.get("acks", []):
+                    handle_ack(ack["id"], ack["status"], now)
+            elif kind == "result":
+                stats["statuses"][data["status"]] += 1
+                if data["id"] in sent:
+                    stats["latency"].append(now - sent[data["id"]])
+                settle(data["id"])
+    async with websockets.connect(url, max_size=None) as websocket:
+        await websocket.send(code)
+        reply = json.loads(await websocket.recv())
+        if "Connection established" not in reply.get("message", ""):
+            raise RuntimeError(f"Handshake rejected: {reply}")
+        receiver = asyncio.create_task(receive(websocket))
+        stats["started"] = time.perf_counter()
+        for start in range(0, len(stream), args.burst):
+            await flow.wait()
+            burst = stream[start:start + args.burst]
+            if args.batch:
+                now = time.perf_counter()
+                for request_id, _ in burst:
+                    sent[request_id] = now
+                await websocket.send(json.dumps({"urls": [{"id": request_id, "url": video_url} for request_id, video_url in burst]}))
+            else:
+                for request_id, video_url in burst:
+                    sent[request_id] = time.perf_counter()
+                    await websocket.send(json.dumps({"id": request_id, "url": video_url}))
+            if args.interval:
+                await asyncio.sleep(args.interval)
+        try:
+            await asyncio.wait_for(done.wait(), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            stats["finished"] = time.perf_counter()
+        stats["unsettled"] = remaining
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+def run_client(url, code, stream, args, stats):
+    asyncio.run(replay(url, code, stream, args, stats))
+async def run_benchmark(server, stream, args):
+    server.get_metadata_cache()
+    server.get_classifier()
+    server.start_pipeline()
+    writer = server.get_log_writer()
+    writer.start()
+    server_obj = await server.start_persistent_server()
+    if server_obj is None:
+        raise RuntimeError(f"Could not bind a WebSocket listener on {server.MULTI_CLIENT_HOST}:{args.port}")
+    port = list(server_obj.sockets)[0].getsockname()[1]
+    lag = []
+    probe = asyncio.create_task(probe_loop_lag(lag, args.lag_interval))
+    stats = {"statuses": Counter(), "latency": [], "ack_latency": [], "saturated": 0, "unsettled": 0}
+    try:
+        await asyncio.to_thread(run_client, f"ws://{server.MULTI_CLIENT_HOST}:{port}", server.EXPECTED_CODE, stream, args, stats)
+        flush_started = time.perf_counter()
+        await writer.flush()
+        stats["final_flush"] = time.perf_counter() - flush_started
+    finally:
+        probe.cancel()
+        server_obj.close()
+        await server_obj.wait_closed()
+        for task in server.pipeline_tasks:
+            task.cancel()
+        await asyncio.gather(probe, *server.pipeline_tasks, return_exceptions=True)
+        await writer.close()
+    return stats, lag
+def configure_server(server, args, extractor):
+    server.YoutubeDL = extractor
+    server.DownloadError = extractor.error_cls
+    server.EXTRACT_EXECUTOR = "thread"
+    server.MULTI_CLIENT = True
+    server.PORTS_TO_TRY = [args.port]
+    server.WRITER_FSYNC = args.fsync
+    server.apply_worker_count(args.workers)
+    server.STORAGE_BACKEND = args.storage
+    server.load_history()
+    server.history_ready.set()
+def build_report(args, stream, unique_videos, extractor, stats, lag, elapsed_total):
+    elapsed = max(stats.get("finished", 0) - stats.get("started", 0), 1e-9)
+    return {
+        "config": {
+            "urls": args.urls, "burst": args.burst, "interval": args.interval, "batch": args.batch,
+            "duplicates": args.duplicates, "latency": args.latency, "jitter": args.jitter,
+            "failure_rate": args.failure_rate, "workers": args.workers, "storage": args.storage,
+            "fsync": args.fsync, "seed": args.seed,
+        },
+        "urls_sent": len(stream),
+        "unique_videos": unique_videos,
+        "duplicate_ratio": round(1 - unique_videos / len(stream), 3) if stream else 0,
+        "statuses": dict(stats["statuses"]),
+        "extractor_calls": extractor.calls,
+        "extractor_failures": extractor.failures,
+        "elapsed_s": round(elapsed, 3),
+        "urls_per_s": round(len(stream) / elapsed, 1),
+        "lookups_per_s": round(len(stats["latency"]) / elapsed, 1),
+        "latency_ms": summarize_ms(stats["latency"]),
+        "ack_latency_ms": summarize_ms(stats["ack_latency"]),
+        "loop_lag_ms": summarize_ms(lag),
+        "final_flush_ms": round(stats.get("final_flush", 0) * 1000, 3),
+        "saturated_replies": stats["saturated"],
+        "unsettled": stats["unsettled"],
+        "peak_rss_mb": peak_rss_mb(),
+        "tracemalloc_peak_mb": round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1) if tracemalloc.is_tracing() else None,
+        "wall_s": round(elapsed_total, 3),
+    }
+def print_report(report):
+    config = report["config"]
+    mode = "batch" if config["batch"] else "per-URL"
+    print(f"Server load: {report['urls_sent']} URLs ({report['unique_videos']} unique, {report['duplicate_ratio']:.0%} duplicates), "
+          f"{mode} bursts of {config['burst']}, fake latency {config['latency'] * 1000:.0f} ms, "
+          f"failure rate {config['failure_rate']:.0%}, storage {config['storage']}")
+    print(f"statuses: {', '.join(f'{status} {count}' for status, count in sorted(report['statuses'].items()))}")
+    print(f"extractor calls {report['extractor_calls']} ({report['extractor_failures']} failed)")
+    print(f"throughput      {report['urls_per_s']:10.1f} URLs/s   {report['lookups_per_s']:10.1f} lookups/s   elapsed {report['elapsed_s']:.2f} s")
+    for label, key in (("end-to-end", "latency_ms"), ("ack", "ack_latency_ms"), ("event-loop lag", "loop_lag_ms")):
+        summary = report[key]
+        if summary["p50"] is None:
+            print(f"{label:<15} n/a")
+        else:
+            print(f"{label:<15} p50 {summary['p50']:9.2f} ms   p99 {summary['p99']:9.2f} ms   max {summary['max']:9.2f} ms")
+    print(f"final flush     {report['final_flush_ms']:9.2f} ms   saturated replies {report['saturated_replies']}")
+    memory = [f"peak RSS {report['peak_rss_mb']} MB" if report["peak_rss_mb"] is not None else "peak RSS n/a"]
+    if report["tracemalloc_peak_mb"] is not None:
+        memory.append(f"traced peak {report['tracemalloc_peak_mb']} MB")
+    print(f"memory          {', '.join(memory)}")
+    if report["unsettled"]:
+        print(f"WARNING: {report['unsettled']} URLs got no reply before the timeout.")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay synthetic URL bursts against the server with a fake yt-dlp extractor and report throughput, latency, event-loop lag and memory.")
+    parser.add_argument("--urls", type=int, default=2000, help="URLs to send (default: 2000)")
+    parser.add_argument("--burst", type=int, default=50, help="URLs per burst (default: 50)")
+    parser.add_argument("--interval", type=float, default=0.05, help="pause between bursts in seconds (default: 0.05)")
+    parser.add_argument("--batch", action="store_true", help="send each burst as one batch message instead of one message per URL")
+    parser.add_argument("--duplicates", type=float, default=0.3, help="share of URLs that repeat a recently sent video (default: 0.3)")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean fake extraction latency in seconds (default: 0.05)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="relative latency jitter, 0-1 (default: 0.5)")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="share of videos whose extraction fails (default: 0.02)")
+    parser.add_argument("--fixtures", default=FIXTURES_FILE, help="JSON list of canned metadata records")
+    parser.add_argument("--workers", type=int, help="extractor and pipeline workers (default: server setting)")
+    parser.add_argument("--storage", choices=["sqlite", "text"], default="sqlite", help="history backend (default: sqlite)")
+    parser.add_argument("--fsync", action="store_true", help="fsync text logs on every flush")
+    parser.add_argument("--port", type=int, default=0, help="listener port (default: any free port)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the URL stream and the fake extractor (default: 1)")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="event-loop lag probe interval in seconds (default: 0.01)")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for outstanding replies (default: 120)")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the traced Python heap peak (slower)")
+    parser.add_argument("--json", help="write the report as JSON to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary working directory")
+    return parser.parse_args()
+def main():
+    args = parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+    extractor = FakeExtractor(args.latency, args.jitter, args.failure_rate, load_fixtures(os.path.abspath(args.fixtures)), args.seed)
+    stream, unique_videos = build_stream(args.urls, args.duplicates, args.seed)
+    original_cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="ytlogger-bench-")
+    os.chdir(workdir)
+    if args.tracemalloc:
+        tracemalloc.start()
+    server = None
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            server = load_server()
+            configure_server(server, args, extractor)
+            stats, lag = asyncio.run(run_benchmark(server, stream, args))
+        report = build_report(args, stream, unique_videos, extractor, stats, lag, time.perf_counter() - started)
+    finally:
+        if server is not None:
+            server.shutdown_extract_executor()
+            if server.video_index is not None:
+                server.video_index.close()
+            if server.history_store is not None:
+                server.history_store.close()
+        os.chdir(original_cwd)
+        if args.keep:
+            print(f"Working directory kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print_report(report)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["unsettled"] else 0
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import argparse
+import importlib.util
+import os
+import statistics
+import sys
+import time
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = os.path.join(REPO_DIR, "server ektension firefox.py")
+def load_server():
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    spec = importlib.util.spec_from_file_location("ytlogger_server", SERVER_SCRIPT)
+    server = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(server)
+    return server
+def fresh_lookup(server, url):
+    with server.YoutubeDL(dict(server.YDL_OPTS)) as ydl:
+        if url:
+            ydl.extract_info(url, download=False)
+def pooled_lookup(server, url):
+    if url:
+        server.extract_info_sync(url)
+    else:
+        server.get_ydl()
+def measure(lookup, server, url, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        lookup(server, url)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+def report(name, timings):
+    ordered = sorted(timings)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{name:<28} mean {statistics.mean(timings):8.2f} ms   p50 {statistics.median(timings):8.2f} ms   p99 {p99:8.2f} ms")
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-lookup YoutubeDL overhead: a fresh instance per lookup vs the pooled instance.")
+    parser.add_argument("--runs", type=int, default=50, help="lookups per variant (default: 50)")
+    parser.add_argument("--url", help="video URL to extract; without it only instance setup is measured (no network)")
+    args = parser.parse_args()
+    server = load_server()
+    server.warm_ydl()
+    fresh = measure(fresh_lookup, server, args.url, args.runs)
+    pooled = measure(pooled_lookup, server, args.url, args.runs)
+    mode = f"lookup of {args.url}" if args.url else "setup only"
+    print(f"YoutubeDL overhead, {args.runs} runs, {mode}")
+    report("before: fresh per lookup", fresh)
+    report("after: pooled instance", pooled)
+    saved = statistics.mean(fresh) - statistics.mean(pooled)
+    print(f"saved per lookup: {saved:.2f} ms")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import bisect
+import json
+import re
+from collections import namedtuple
+MUSIC_KEYWORDS = ['official video', 'lyrics', 'remix', 'cover', 'audio', 'ft.', 'feat', 'mv']
+DEFAULT_RULES = {
+    "threshold": 1.0,
+    "rules": [
+        {"name": "title_keyword", "field": "title", "keywords": MUSIC_KEYWORDS, "weight": 1.0},
+        {"name": "tag", "field": "tags", "keywords": ["music"], "exact": MUSIC_KEYWORDS, "weight": 1.0},
+        {"name": "description_keyword", "field": "description", "keywords": [" album ", " single ", " stream now ", "music video"], "weight": 1.0},
+        {"name": "category", "field": "categories", "keywords": ["music"], "weight": 1.0},
+        {"name": "channel_pattern", "field": "channel", "keywords": ["vevo", "topic"], "weight": 1.0},
+        {"name": "official_artist_channel", "field": "description", "keywords": ["official artist channel"], "weight": 1.0},
+    ],
+}
+LIST_FIELDS = {"tags", "categories"}
+RECORD_SEPARATOR = "\x00"
+Classification = namedtuple("Classification", ["is_music", "score", "rule", "matched"])
+class Rule:
+    def __init__(self, name, field, keywords=(), exact=(), patterns=(), weight=1.0):
+        self.name = name
+        self.field = field
+        self.weight = float(weight)
+        needles = [keyword.lower() for keyword in keywords]
+        needles.extend(f"\n{value.lower()}\n" for value in exact)
+        self.needles = tuple(dict.fromkeys(needles))
+        self.regex = re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE) if patterns else None
+        if not self.needles and self.regex is None:
+            raise ValueError(f"Rule '{name}' has no keywords, exact values or patterns.")
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(spec["name"], spec["field"], spec.get("keywords", ()), spec.get("exact", ()), spec.get("patterns", ()), spec.get("weight", 1.0))
+    def matches(self, text):
+        for needle in self.needles:
+            if needle in text:
+                return True
+        return self.regex is not None and self.regex.search(text) is not None
+    def matching_records(self, blob, starts):
+        hits = set()
+        for needle in self.needles:
+            pos = blob.find(needle)
+            while pos != -1:
+                index = bisect.bisect_right(starts, pos) - 1
+                hits.add(index)
+                if index + 1 >= len(starts):
+                    break
+                pos = blob.find(needle, starts[index + 1])
+        if self.regex is not None:
+            pos = 0
+            while True:
+                m = self.regex.search(blob, pos)
+                if m is None:
+                    break
+                index = bisect.bisect_right(starts, m.start()) - 1
+                hits.add(index)
+                if index + 1 >= len(starts):
+                    break
+                pos = starts[index + 1]
+        return hits
+def field_text(info, field):
+    value = info.get(field)
+    if value is None:
+        return ""
+    if field in LIST_FIELDS:
+        if not isinstance(value, list):
+            return ""
+        try:
+            text = "\n".join(value)
+        except TypeError:
+            text = "\n".join(str(item) for item in value if item is not None)
+        return "\n" + text.replace(RECORD_SEPARATOR, " ").lower() + "\n"
+    return str(value).replace(RECORD_SEPARATOR, " ").lower()
+def unwrap_info(info):
+    if isinstance(info, dict) and info.get('_type') == 'playlist' and 'entries' in info:
+        entries = info['entries']
+        return entries[0] if entries else None
+    return info
+class MusicClassifier:
+    def __init__(self, rules, threshold=1.0):
+        self.rules = [rule if isinstance(rule, Rule) else Rule.from_dict(rule) for rule in rules]
+        self.threshold = float(threshold)
+        self.not_music = Classification(False, 0.0, None, ())
+    @classmethod
+    def from_config(cls, config):
+        return cls(config["rules"], config.get("threshold", 1.0))
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_config(json.load(f))
+    def result(self, matched):
+        score = sum(rule.weight for rule in matched)
+        if not matched:
+            return self.not_music
+        strongest = max(matched, key=lambda rule: rule.weight)
+        return Classification(score >= self.threshold, score, strongest.name, tuple(rule.name for rule in matched))
+    def classify(self, info):
+        info = unwrap_info(info)
+        if not isinstance(info, dict):
+            return self.not_music
+        texts = {}
+        matched = []
+        for rule in self.rules:
+            text = texts.get(rule.field)
+            if text is None:
+                text = texts[rule.field] = field_text(info, rule.field)
+            if text and rule.matches(text):
+                matched.append(rule)
+        return self.result(matched)
+    def is_music(self, info):
+        return self.classify(info).is_music
+    def classify_many(self, infos):
+        infos = [unwrap_info(info) for info in infos]
+        matched = [[] for _ in infos]
+        valid = [i for i, info in enumerate(infos) if isinstance(info, dict)]
+        if not valid:
+            return [self.not_music for _ in infos]
+        blobs = {}
+        for rule in self.rules:
+            blob = blobs.get(rule.field)
+            if blob is None:
+                texts = [field_text(infos[i], rule.field) for i in valid]
+                starts = []
+                offset = 0
+                for text in texts:
+                    starts.append(offset)
+                    offset += len(text) + 1
+                blob = blobs[rule.field] = (RECORD_SEPARATOR.join(texts), starts)
+            for index in sorted(rule.matching_records(*blob)):
+                matched[valid[index]].append(rule)
+        return [self.result(rules) for rules in matched]
+def load_classifier(path=None):
+    if path:
+        return MusicClassifier.from_file(path)
+    return MusicClassifier.from_config(DEFAULT_RULES)
@@ -3,6 +3,7 @@ import importlib
 import platform
 import os
 import re
+import sys
 def clear_console():
     if platform.system() == "Windows":
         os.system('cls')
@@ -14,27 +15,104 @@ packages = {
 }
 def install_if_missing(module_name, pip_name):
     try:
-        importlib.import_module(module_name)
-        print(f"Modul '{module_name}' sudah terinstal.")
+        return importlib.import_module(module_name)
     except ImportError:
         print(f"Modul '{module_name}' tidak ditemukan. Menginstal package '{pip_name}'...")
-        subprocess.check_call(['pip', 'install', pip_name])
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install', pip_name])
+        importlib.invalidate_caches()
         print(f"Package '{pip_name}' berhasil diinstal.")
-for module_name, pip_name in packages.items():
-    install_if_missing(module_name, pip_name)
-    clear_console()
+        return importlib.import_module(module_name)
+try:
+    import websockets
+except ImportError:
+    websockets = install_if_missing('websockets', packages['websockets'])
 import asyncio
-import websockets
 import json
 from urllib.parse import urlparse, parse_qs
 import threading
 import logging
-from yt_dlp import YoutubeDL, DownloadError
-MUSIC_KEYWORDS = ['official video', 'lyrics', 'remix', 'cover', 'audio', 'ft.', 'feat', 'mv']
+import concurrent.futures
+import sqlite3
+import time
+import argparse
+import bisect
+import hmac
+import ipaddress
+from collections import OrderedDict
+from music_classifier import load_classifier
+from video_index import VideoIndex
+CLASSIFIER_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "music_rules.json")
+YOUTUBE_ID_PATTERN = re.compile(r'(?:https?://)?(?:www\.)?(?:youtu\.be/|youtube\.com/(?:embed|v|shorts)/)(?P<id>[A-Za-z0-9_-]{11})')
 LOG_FILE = "tab_log.txt"
 UN_LOG_FILE = "un_log.txt"
+STORAGE_BACKEND = "sqlite"
+DB_FILE = "history.db"
+INDEX_FILE = "history.idx"
+EXPORT_TEXT_LOGS = True
+METADATA_FIELDS = ['id', 'title', 'channel', 'channel_id', 'uploader', 'duration', 'upload_date', 'view_count', 'categories', 'tags', 'description', 'webpage_url']
 PORTS_TO_TRY = [3101, 3202, 3303, 3404, 3505]
-EXPECTED_CODE = "EKSTENSI_FIREFOX_1234"
+DEFAULT_CODE = "EKSTENSI_FIREFOX_1234"
+EXPECTED_CODE = DEFAULT_CODE
+MULTI_CLIENT = False
+MULTI_CLIENT_HOST = "127.0.0.1"
+MAX_CLIENTS = 32
+EXTRACT_EXECUTOR = "thread"
+EXTRACT_WORKERS = 4
+EXTRACT_TIMEOUT = 45
+EXTRACT_START_POLL = 0.01
+YDL_MAX_USES = 200
+YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'forcetitle': True,
+    'forcetags': True,
+    'forcedescription': True,
+    'extract_flat': True,
+    'skip_download': True,
+    'nocheckcertificate': True,
+    'no_check_certificate': True,
+    'geo_bypass': True
+}
+PIPELINE_WORKERS = EXTRACT_WORKERS
+PIPELINE_QUEUE_SIZE = 1000
+SATURATION_RATIO = 0.8
+INGEST_CHUNK_SIZE = 500
+INGEST_PROGRESS_INTERVAL = 2.0
+RECLASSIFY_CHUNK_SIZE = 1000
+WRITER_BATCH_SIZE = 64
+WRITER_FLUSH_INTERVAL = 1.0
+WRITER_FSYNC = False
+CACHE_TTL = 7 * 24 * 3600
+CACHE_NEGATIVE_TTL = 6 * 3600
+CACHE_MAX_ENTRIES = 5000
+CACHE_FILE = "metadata_cache.json"
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = None
+TRACE_URLS = False
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRIC_HELP = {
+    "ytlogger_canonicalize_seconds": "Time spent canonicalizing incoming URLs.",
+    "ytlogger_canonicalize_total": "Canonicalized URLs by result.",
+    "ytlogger_extract_seconds": "yt-dlp extraction attempt latency by outcome.",
+    "ytlogger_extract_total": "yt-dlp extraction attempts by outcome.",
+    "ytlogger_extract_retries_total": "yt-dlp extraction retries.",
+    "ytlogger_cache_total": "Metadata cache lookups by result.",
+    "ytlogger_classify_seconds": "Time spent classifying metadata.",
+    "ytlogger_classified_total": "Classified videos by classification.",
+    "ytlogger_lookup_failures_total": "URLs whose metadata could not be fetched.",
+    "ytlogger_job_seconds": "End-to-end time from enqueue to logged result.",
+    "ytlogger_log_flush_seconds": "Log writer group-commit latency.",
+    "ytlogger_log_records_total": "Records written by the log writer.",
+    "ytlogger_duplicates_total": "Skipped duplicate URLs by stage.",
+    "ytlogger_connections_total": "WebSocket client events.",
+    "ytlogger_reboots_total": "Listener reboots.",
+    "ytlogger_queue_depth": "URLs waiting in the pipeline queue.",
+    "ytlogger_in_flight": "URLs queued or being processed.",
+    "ytlogger_clients": "Authenticated WebSocket clients.",
+    "ytlogger_cache_entries": "Entries in the metadata cache.",
+    "ytlogger_writer_pending": "Records buffered in the log writer.",
+    "ytlogger_index_entries": "Videos in the dedup index.",
+}
 logging.basicConfig(
     filename="logging.txt",
     level=logging.INFO,
@@ -42,54 +120,344 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S"
 )
 logger = logging.getLogger(__name__)
-logged_links = set()
-un_logged_links = set()
 connection_established_event = asyncio.Event()
 successful_port = None
 active_client_websocket = None
 running_servers = {}
-def load_logged_links():
-    if os.path.exists(LOG_FILE):
+connected_clients = set()
+extract_executor = None
+extract_semaphore = None
+ydl_local = threading.local()
+yt_dlp_lock = threading.Lock()
+YoutubeDL = None
+DownloadError = None
+history_ready = asyncio.Event()
+shutdown_event = asyncio.Event()
+url_queue = None
+in_flight = {}
+pipeline_tasks = []
+history_store = None
+video_index = None
+log_writer = None
+metadata_cache = None
+classifier = None
+def iter_text_log_ids(path, is_music):
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                url = line.strip().split(" | ", 1)[0]
+                if url:
+                    yield video_id_from_url(url), is_music
+    except Exception as e:
+        logger.error(f"Error loading links from {path}: {e}")
+def video_id_from_url(canonical_url):
+    return canonical_url.rsplit("=", 1)[-1]
+class VideoStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL" if WRITER_FSYNC else "PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    video_id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    title TEXT,
+                    classification TEXT NOT NULL,
+                    processed_at REAL NOT NULL,
+                    channel TEXT,
+                    metadata TEXT
+                ) WITHOUT ROWID
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_classification ON videos (classification)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_processed_at ON videos (processed_at)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', ?)", (str(int.from_bytes(os.urandom(3), "big") << 32),))
+    def bump_version(self):
+        self.conn.execute("UPDATE store_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+        return int(self.conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0])
+    def version(self):
+        return int(self.get_meta("version") or 0)
+    def contains(self, video_id):
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        return row is not None
+    def known_ids(self, video_ids):
+        video_ids = list(video_ids)
+        known = set()
+        with self.lock:
+            for i in range(0, len(video_ids), 500):
+                chunk = video_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(f"SELECT video_id FROM videos WHERE video_id IN ({placeholders})", chunk)
+                known.update(row[0] for row in rows)
+        return known
+    def add_many(self, records):
+        rows = [
+            (r["video_id"], r["url"], r["title"], r["classification"], r["processed_at"], r.get("channel"), json.dumps(r.get("metadata") or {}, ensure_ascii=False))
+            for r in records
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO videos (video_id, url, title, classification, processed_at, channel, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return self.bump_version()
+    def add(self, record):
+        return self.add_many([record])
+    def count(self, classification=None):
+        with self.lock:
+            if classification is None:
+                return self.conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+            return self.conn.execute("SELECT COUNT(*) FROM videos WHERE classification = ?", (classification,)).fetchone()[0]
+    def iter_records(self, classification=None):
+        query = "SELECT video_id, url, title, classification, processed_at, channel, metadata FROM videos"
+        params = ()
+        if classification is not None:
+            query += " WHERE classification = ?"
+            params = (classification,)
+        with self.lock:
+            cursor = self.conn.execute(query + " ORDER BY processed_at", params)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for video_id, url, title, classification, processed_at, channel, metadata in rows:
+                yield {
+                    "video_id": video_id,
+                    "url": url,
+                    "title": title,
+                    "classification": classification,
+                    "processed_at": processed_at,
+                    "channel": channel,
+                    "metadata": json.loads(metadata) if metadata else {},
+                }
+    def iter_classifications(self):
+        with self.lock:
+            cursor = self.conn.execute("SELECT video_id, classification FROM videos")
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for video_id, classification in rows:
+                yield video_id, classification == "music"
+    def update_classifications(self, changes):
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE videos SET classification = ? WHERE video_id = ?", changes)
+            return self.bump_version()
+    def get_meta(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    def set_meta(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)", (key, value))
+    def import_text_log(self, path, classification):
+        if not os.path.exists(path):
+            return 0
+        imported_at = os.path.getmtime(path)
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split(" | ", 1)
+                url = parts[0].strip()
+                if not url.startswith("https://www.youtube.com/watch?v="):
+                    continue
+                title = parts[1] if len(parts) > 1 else None
+                records.append({
+                    "video_id": video_id_from_url(url),
+                    "url": url,
+                    "title": title,
+                    "classification": classification,
+                    "processed_at": imported_at,
+                    "metadata": {"source": path},
+                })
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO videos (video_id, url, title, classification, processed_at, channel, metadata) VALUES (?, ?, ?, ?, ?, NULL, ?)",
+                [(r["video_id"], r["url"], r["title"], r["classification"], r["processed_at"], json.dumps(r["metadata"])) for r in records],
+            )
+            self.bump_version()
+        return len(records)
+    def export_text_logs(self, log_file, un_log_file):
+        counts = {}
+        for classification, path in (("music", log_file), ("non_music", un_log_file)):
+            counts[classification] = 0
+            with open(path, "w", encoding="utf-8") as f:
+                for record in self.iter_records(classification):
+                    f.write(f"{record['url']} | {record['title'] or 'Unknown Title'}\n")
+                    counts[classification] += 1
+        return counts
+    def close(self):
+        with self.lock:
+            self.conn.close()
+def open_history_store():
+    store = VideoStore(DB_FILE)
+    if store.get_meta("text_import_done") is None:
+        music = store.import_text_log(LOG_FILE, "music")
+        non_music = store.import_text_log(UN_LOG_FILE, "non_music")
+        store.set_meta("text_import_done", str(time.time()))
+        if music or non_music:
+            logger.info(f"Imported {music} music and {non_music} non-music entries from text logs into {DB_FILE}.")
+            print(f"Imported {music + non_music} entries from {LOG_FILE}/{UN_LOG_FILE} into {DB_FILE}.")
+    logger.info(f"Opened history store {DB_FILE} with {store.count()} entries.")
+    return store
+def index_source_token():
+    if history_store is not None:
+        return history_store.version()
+    stats = []
+    for path in (LOG_FILE, UN_LOG_FILE):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stats.append((stat.st_size, stat.st_mtime_ns))
+        else:
+            stats.append((0, 0))
+    return hash(tuple(stats)) & 0xFFFFFFFFFFFFFFFF
+def iter_history_ids():
+    if history_store is not None:
+        yield from history_store.iter_classifications()
+        return
+    yield from iter_text_log_ids(LOG_FILE, True)
+    yield from iter_text_log_ids(UN_LOG_FILE, False)
+def open_video_index():
+    token = index_source_token()
+    started = time.perf_counter()
+    if os.path.exists(INDEX_FILE):
         try:
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                for line in f:
-                    parts = line.strip().split(" | ", 1)
-                    if parts:
-                        url = parts[0]
-                        logged_links.add(url)
-            logger.info(f"Loaded {len(logged_links)} logged links from {LOG_FILE}.")
+            index = VideoIndex.load(INDEX_FILE, token)
+            logger.info(f"Mapped video index {INDEX_FILE} with {len(index)} entries in {(time.perf_counter() - started) * 1000:.1f} ms.")
+            return index
+        except LookupError:
+            logger.info(f"Video index {INDEX_FILE} is out of date; rebuilding.")
         except Exception as e:
-            logger.error(f"Error loading logged links from {LOG_FILE}: {e}")
-def load_un_logged_links():
-    if os.path.exists(UN_LOG_FILE):
+            logger.warning(f"Could not read video index {INDEX_FILE}: {e}. Rebuilding.")
+    index = VideoIndex.build(iter_history_ids(), token)
+    logger.info(f"Built video index with {len(index)} entries in {time.perf_counter() - started:.2f}s.")
+    try:
+        index.save(INDEX_FILE)
+    except Exception as e:
+        logger.error(f"Error saving video index to {INDEX_FILE}: {e}")
+    return index
+def save_video_index():
+    if video_index is None:
+        return
+    if video_index.token != index_source_token():
+        logger.warning(f"History changed outside this server since {INDEX_FILE} was loaded; it will be rebuilt on the next start.")
+    try:
+        if video_index.save(INDEX_FILE):
+            logger.info(f"Saved video index with {len(video_index)} entries to {INDEX_FILE}.")
+    except Exception as e:
+        logger.error(f"Error saving video index to {INDEX_FILE}: {e}")
+def load_history():
+    global history_store, video_index
+    if STORAGE_BACKEND == "sqlite":
         try:
-            with open(UN_LOG_FILE, "r", encoding="utf-8") as f:
-                for line in f:
-                    parts = line.strip().split(" | ", 1)
-                    if parts:
-                       url = parts[0]
-                       un_logged_links.add(url)
-            logger.info(f"Loaded {len(un_logged_links)} unlogged links from {UN_LOG_FILE}.")
+            history_store = open_history_store()
         except Exception as e:
-            logger.error(f"Error loading unlogged links from {UN_LOG_FILE}: {e}")
-load_logged_links()
-load_un_logged_links()
+            logger.error(f"Error opening history store {DB_FILE}: {e}. Falling back to text logs.", exc_info=True)
+            history_store = None
+    if video_index is not None:
+        video_index.close()
+    video_index = open_video_index()
+async def load_history_in_background(event_queue=None):
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        await loop.run_in_executor(None, load_history)
+        await loop.run_in_executor(None, get_metadata_cache)
+        await loop.run_in_executor(None, get_classifier)
+        get_extract_executor()
+        if EXTRACT_EXECUTOR == "process":
+            await loop.run_in_executor(None, load_yt_dlp)
+    except Exception as e:
+        logger.error(f"Error loading history in the background: {e}", exc_info=True)
+    finally:
+        get_log_writer().start()
+        history_ready.set()
+    count = len(video_index) if video_index is not None else 0
+    logger.info(f"History ready with {count} videos after {time.perf_counter() - started:.2f}s.")
+    if event_queue:
+        await event_queue.put(f"History loaded: {count} videos ({time.perf_counter() - started:.2f}s).")
+async def wait_for_history():
+    if not history_ready.is_set():
+        logger.info("Waiting for history to finish loading...")
+        await history_ready.wait()
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self.counters = {}
+        self.histograms = {}
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+    def render(self, gauges):
+        lines = []
+        seen = set()
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+        for (name, labels), value in sorted(self.counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in sorted(self.histograms.items()):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        for name, value in gauges.items():
+            header(name, "gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+    def snapshot(self, gauges):
+        return {
+            "counters": {f"{name}{format_labels(labels)}": value for (name, labels), value in sorted(self.counters.items())},
+            "histograms": {
+                f"{name}{format_labels(labels)}": {"count": count, "sum": round(total, 6), "avg_ms": round(total / count * 1000, 3) if count else 0.0}
+                for (name, labels), (counts, total, count) in sorted(self.histograms.items())
+            },
+            "gauges": gauges,
+        }
+metrics = Metrics()
 async def canonicalize_youtube_url(url):
+    started = time.perf_counter()
+    canonical_url = parse_youtube_url(url)
+    metrics.observe("ytlogger_canonicalize_seconds", time.perf_counter() - started)
+    metrics.inc("ytlogger_canonicalize_total", result="ok" if canonical_url else "invalid")
+    return canonical_url
+def parse_youtube_url(url):
     if not url:
         logger.debug(f"URL kosong: {url}")
         return None
     try:
-        patterns = [
-            r'(?:https?://)?(?:www\.)?youtu\.be/(?P<id>[A-Za-z0-9_-]{11})',
-            r'(?:https?://)?(?:www\.)?youtube\.com/embed/(?P<id>[A-Za-z0-9_-]{11})',
-            r'(?:https?://)?(?:www\.)?youtube\.com/v/(?P<id>[A-Za-z0-9_-]{11})',
-            r'(?:https?://)?(?:www\.)?youtube\.com/shorts/(?P<id>[A-Za-z0-9_-]{11})',
-        ]
-        for pat in patterns:
-            m = re.search(pat, url)
-            if m:
-                video_id = m.group('id')
-                return f"https://www.youtube.com/watch?v={video_id}"
+        m = YOUTUBE_ID_PATTERN.search(url)
+        if m:
+            return f"https://www.youtube.com/watch?v={m.group('id')}"
         parsed = urlparse(url)
         if parsed.hostname and 'youtube' in parsed.hostname:
             qs = parse_qs(parsed.query)
@@ -101,75 +469,530 @@ async def canonicalize_youtube_url(url):
     except Exception as e:
         logger.error(f"Error parsing atau canonicalizing URL {url}: {e}")
         return None
+def get_extract_executor():
+    global extract_executor
+    if extract_executor is None:
+        if EXTRACT_EXECUTOR == "process":
+            extract_executor = concurrent.futures.ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+        else:
+            extract_executor = concurrent.futures.ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="yt-dlp")
+        for _ in range(EXTRACT_WORKERS):
+            extract_executor.submit(warm_ydl).add_done_callback(log_warm_up_error)
+        logger.info(f"Started yt-dlp {EXTRACT_EXECUTOR} pool with {EXTRACT_WORKERS} pre-warmed workers.")
+    return extract_executor
+def get_extract_semaphore():
+    global extract_semaphore
+    if extract_semaphore is None:
+        extract_semaphore = asyncio.Semaphore(EXTRACT_WORKERS)
+    return extract_semaphore
+def shutdown_extract_executor():
+    global extract_executor
+    if extract_executor is not None:
+        extract_executor.shutdown(wait=False, cancel_futures=True)
+        extract_executor = None
+        logger.info("yt-dlp worker pool shut down.")
+def load_yt_dlp():
+    global YoutubeDL, DownloadError
+    with yt_dlp_lock:
+        if YoutubeDL is None:
+            started = time.perf_counter()
+            yt_dlp = install_if_missing('yt_dlp', packages['yt_dlp'])
+            DownloadError = yt_dlp.DownloadError
+            YoutubeDL = yt_dlp.YoutubeDL
+            logger.info(f"Imported yt-dlp in {threading.current_thread().name} in {(time.perf_counter() - started) * 1000:.0f} ms.")
+    return YoutubeDL
+def discard_ydl():
+    ydl = getattr(ydl_local, "ydl", None)
+    ydl_local.ydl = None
+    ydl_local.uses = 0
+    if ydl is not None:
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.debug(f"Error closing YoutubeDL instance: {e}")
+def get_ydl():
+    ydl = getattr(ydl_local, "ydl", None)
+    if ydl is not None and ydl_local.uses >= YDL_MAX_USES:
+        logger.debug(f"Recycling YoutubeDL instance in {threading.current_thread().name} after {ydl_local.uses} uses.")
+        discard_ydl()
+        ydl = None
+    if ydl is None:
+        ydl = (YoutubeDL or load_yt_dlp())(dict(YDL_OPTS))
+        ydl_local.ydl = ydl
+        ydl_local.uses = 0
+    ydl_local.uses += 1
+    return ydl
+def warm_ydl():
+    if getattr(ydl_local, "ydl", None) is None:
+        get_ydl()
+        ydl_local.uses = 0
+def log_warm_up_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Could not pre-warm a yt-dlp worker: {future.exception()}")
+class ExtractorUnavailable(RuntimeError):
+    pass
+def extract_info_sync(canonical_url, sanitize=False):
+    try:
+        ydl = get_ydl()
+    except Exception as e:
+        raise ExtractorUnavailable(f"yt-dlp is unavailable: {e}") from None
+    try:
+        info = ydl.extract_info(canonical_url, download=False)
+        if sanitize:
+            info = ydl.sanitize_info(info)
+        return info
+    except Exception as e:
+        discard_ydl()
+        if DownloadError is not None and isinstance(e, DownloadError):
+            raise DownloadError(str(e)) from None
+        raise
+def record_extract_attempt(outcome, started):
+    metrics.observe("ytlogger_extract_seconds", time.perf_counter() - started, outcome=outcome)
+    metrics.inc("ytlogger_extract_total", outcome=outcome)
+def call_soon_from_thread(loop, callback, *args):
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        pass
+def finish_abandoned_extract(canonical_url, future):
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is None:
+        store_metadata(video_id_from_url(canonical_url), future.result())
+        logger.info(f"Cached metadata for {canonical_url} after its lookup was abandoned.")
+    elif DownloadError is not None and isinstance(error, DownloadError):
+        store_metadata(video_id_from_url(canonical_url), None)
+def abandon_extract(loop, canonical_url, future, waiter):
+    waiter.cancel()
+    if not future.cancel():
+        future.add_done_callback(lambda f: call_soon_from_thread(loop, finish_abandoned_extract, canonical_url, f))
 async def extract_info(canonical_url, retries=2):
+    loop = asyncio.get_running_loop()
+    executor = get_extract_executor()
+    semaphore = get_extract_semaphore()
+    sanitize = EXTRACT_EXECUTOR == "process"
+    future = waiter = None
     for i in range(retries):
+        started = time.perf_counter()
+        submitted = future is not None
         try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'forcetitle': True,
-                'forcetags': True,
-                'forcedescription': True,
-                'extract_flat': True,
-                'skip_download': True,
-                'nocheckcertificate': True,
-                'no_check_certificate': True,
-                'geo_bypass': True
-            }
-            with YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(canonical_url, download=False)
-                return info
-        except DownloadError as de:
-             logger.warning(f"yt-dlp DownloadError for {canonical_url}: {de}")
-             return None
+            if future is None:
+                await semaphore.acquire()
+                try:
+                    future = executor.submit(extract_info_sync, canonical_url, sanitize)
+                except BaseException:
+                    semaphore.release()
+                    raise
+                submitted = True
+                future.add_done_callback(lambda f: call_soon_from_thread(loop, semaphore.release))
+                waiter = asyncio.wrap_future(future)
+                while not future.running() and not future.done():
+                    await asyncio.sleep(EXTRACT_START_POLL)
+                started = time.perf_counter()
+            info = await asyncio.wait_for(asyncio.shield(waiter), timeout=EXTRACT_TIMEOUT)
+            record_extract_attempt("success", started)
+            return info
+        except asyncio.CancelledError:
+            if waiter is not None:
+                abandon_extract(loop, canonical_url, future, waiter)
+            raise
+        except asyncio.TimeoutError:
+            record_extract_attempt("timeout", started)
+            if i < retries - 1:
+                metrics.inc("ytlogger_extract_retries_total")
+                logger.warning(f"yt-dlp still running after {EXTRACT_TIMEOUT}s for {canonical_url}. Waiting again {i+1}/{retries}")
+            else:
+                logger.error(f"yt-dlp timed out after {retries * EXTRACT_TIMEOUT}s for {canonical_url}; its result will still be cached if it finishes.")
+                abandon_extract(loop, canonical_url, future, waiter)
         except Exception as e:
+            future = waiter = None
+            if DownloadError is not None and isinstance(e, DownloadError):
+                record_extract_attempt("download_error", started)
+                logger.warning(f"yt-dlp DownloadError for {canonical_url}: {e}")
+                return None
+            if not submitted or isinstance(e, (concurrent.futures.BrokenExecutor, ExtractorUnavailable)):
+                record_extract_attempt("unavailable", started)
+                logger.error(f"yt-dlp could not run for {canonical_url}: {e}")
+                raise
+            record_extract_attempt("error", started)
             if i < retries - 1:
+                metrics.inc("ytlogger_extract_retries_total")
                 logger.warning(f"yt-dlp failed for {canonical_url}. Retry {i+1}/{retries}: {e}")
                 await asyncio.sleep(1)
             else:
                 logger.error(f"yt-dlp failed after {retries} attempts for {canonical_url}: {e}", exc_info=True)
     return None
-def is_music_video(info):
+def trim_metadata(info):
+    return {field: info.get(field) for field in METADATA_FIELDS if info.get(field) is not None}
+class MetadataCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, negative_ttl=CACHE_NEGATIVE_TTL, path=CACHE_FILE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    def get(self, video_id):
+        entry = self.entries.get(video_id)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        expires_at, info = entry
+        if expires_at < time.time():
+            del self.entries[video_id]
+            self.misses += 1
+            return False, None
+        self.entries.move_to_end(video_id)
+        self.hits += 1
+        return True, info
+    def put(self, video_id, info):
+        ttl = self.ttl if info is not None else self.negative_ttl
+        self.entries[video_id] = (time.time() + ttl, info)
+        self.entries.move_to_end(video_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    def items(self):
+        now = time.time()
+        return [(video_id, info) for video_id, (expires_at, info) in self.entries.items() if expires_at >= now]
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            now = time.time()
+            for video_id, (expires_at, info) in sorted(data.items(), key=lambda item: item[1][0]):
+                if expires_at >= now:
+                    self.entries[video_id] = (expires_at, info)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            logger.info(f"Loaded {len(self.entries)} cached metadata entries from {self.path}.")
+        except Exception as e:
+            logger.error(f"Error loading metadata cache from {self.path}: {e}")
+    def save(self):
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({video_id: [expires_at, info] for video_id, (expires_at, info) in self.entries.items()}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            logger.info(f"Saved {len(self.entries)} cached metadata entries to {self.path}.")
+        except Exception as e:
+            logger.error(f"Error saving metadata cache to {self.path}: {e}")
+def get_metadata_cache():
+    global metadata_cache
+    if metadata_cache is None:
+        metadata_cache = MetadataCache()
+        metadata_cache.load()
+    return metadata_cache
+async def lookup_metadata(canonical_url):
+    cache = get_metadata_cache()
+    video_id = video_id_from_url(canonical_url)
+    hit, info = cache.get(video_id)
+    metrics.inc("ytlogger_cache_total", result="miss" if not hit else "hit" if info is not None else "negative_hit")
+    if hit:
+        logger.debug(f"Metadata cache {'hit' if info is not None else 'negative hit'} for {canonical_url}")
+        return info
+    return store_metadata(video_id, await extract_info(canonical_url))
+def store_metadata(video_id, info):
+    info = trim_metadata(info) if info else None
+    get_metadata_cache().put(video_id, info)
+    return info
+def get_classifier():
+    global classifier
+    if classifier is None:
+        try:
+            if os.path.exists(CLASSIFIER_RULES_FILE):
+                classifier = load_classifier(CLASSIFIER_RULES_FILE)
+                logger.info(f"Loaded {len(classifier.rules)} classifier rules from {CLASSIFIER_RULES_FILE}.")
+            else:
+                classifier = load_classifier()
+                logger.info("Classifier rule file not found; using built-in rules.")
+        except Exception as e:
+            logger.error(f"Error loading classifier rules from {CLASSIFIER_RULES_FILE}: {e}. Using built-in rules.")
+            classifier = load_classifier()
+    return classifier
+def classify_video(info):
+    engine = get_classifier()
     try:
         if info is None:
             logger.debug("Info is None, cannot determine if music video.")
-            return False
-        if 'entries' in info and info.get('_type') == 'playlist':
-             if info['entries']:
-                 info = info['entries'][0]
-             else:
-                 logger.debug("Playlist with no entries, cannot determine if music video.")
-                 return False
-        if not isinstance(info, dict):
-             logger.warning(f"Unexpected info format from yt-dlp: {type(info)}")
-             return False
-        title = info.get('title', '').lower()
-        tags = [str(tag).lower() for tag in info.get('tags', []) if tag is not None] if isinstance(info.get('tags'), list) else []
-        description = str(info.get('description', '')).lower() if info.get('description') is not None else ''
-        categories = [str(cat).lower() for cat in info.get('categories', []) if cat is not None] if isinstance(info.get('categories'), list) else []
-        channel = str(info.get('channel', '')).lower() if info.get('channel') is not None else ''
-        logger.debug(f"Analyzing video: Title='{title}', Tags='{tags}', Categories='{categories}', Channel='{channel}'")
-        if any(keyword in title for keyword in MUSIC_KEYWORDS):
-            logger.debug(f"Music video identified by title keywords: '{title}'")
-            return True
-        if any('music' in tag or tag in MUSIC_KEYWORDS for tag in tags):
-            logger.debug(f"Music video identified by tags: '{tags}'")
-            return True
-        desc_keywords = [' album ', ' single ', ' stream now ', 'music video']
-        if any(keyword in description for keyword in desc_keywords):
-            logger.debug(f"Music video identified by description keywords")
-            return True
-        if any('music' in category for category in categories):
-             logger.debug(f"Music video identified by categories: '{categories}'")
-             return True
-        if 'vevo' in channel or 'official artist channel' in description or 'topic' in channel:
-             logger.debug(f"Music video identified by channel/description pattern (VEVO/Topic/Official Artist Channel)")
-             return True
-        logger.debug("Not identified as music video based on heuristics.")
-        return False
+            return engine.not_music
+        result = engine.classify(info)
+        if result.is_music:
+            logger.debug(f"Music video identified by rule '{result.rule}' (score {result.score}, matched {list(result.matched)})")
+        else:
+            logger.debug(f"Not identified as music video based on heuristics (score {result.score}).")
+        return result
     except Exception as e:
-        logger.warning(f"Error analyzing video info in is_music_video: {e}", exc_info=True)
-    return False
+        logger.warning(f"Error analyzing video info in classify_video: {e}", exc_info=True)
+    return engine.not_music
+def is_music_video(info):
+    return classify_video(info).is_music
+class UrlJob:
+    def __init__(self, canonical_url):
+        self.canonical_url = canonical_url
+        self.video_id = video_id_from_url(canonical_url)
+        self.future = asyncio.get_running_loop().create_future()
+        self.owners = set()
+        self.task = None
+        self.error = False
+        self.submitted_at = time.perf_counter()
+        self.trace = {}
+def is_processed(canonical_url):
+    video_id = video_id_from_url(canonical_url)
+    if log_writer is not None and log_writer.is_pending(video_id):
+        return True
+    if video_index is not None:
+        return video_id in video_index
+    return history_store is not None and history_store.contains(video_id)
+def build_record(canonical_url, info, is_music):
+    return {
+        "video_id": video_id_from_url(canonical_url),
+        "url": canonical_url,
+        "title": info.get("title", "Unknown Title"),
+        "classification": "music" if is_music else "non_music",
+        "processed_at": time.time(),
+        "channel": info.get("channel"),
+        "metadata": trim_metadata(info),
+    }
+class LogWriter:
+    def __init__(self, store, text_logs):
+        self.store = store
+        self.text_logs = text_logs
+        self.buffer = []
+        self.pending_ids = set()
+        self.handles = {}
+        self.write_lock = threading.Lock()
+        self.flush_lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-writer")
+        self.task = None
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+    def is_pending(self, video_id):
+        return video_id in self.pending_ids
+    def submit(self, record):
+        self.buffer.append(record)
+        self.pending_ids.add(record["video_id"])
+        if len(self.buffer) >= WRITER_BATCH_SIZE:
+            self.wakeup.set()
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=WRITER_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing log writer: {e}", exc_info=True)
+    async def flush(self):
+        async with self.flush_lock:
+            if not self.buffer:
+                return
+            batch, self.buffer = self.buffer, []
+            started = time.perf_counter()
+            try:
+                await asyncio.get_running_loop().run_in_executor(self.executor, self.write_batch, batch)
+            except Exception:
+                self.buffer[:0] = batch
+                raise
+            metrics.observe("ytlogger_log_flush_seconds", time.perf_counter() - started)
+            metrics.inc("ytlogger_log_records_total", len(batch))
+            for record in batch:
+                self.pending_ids.discard(record["video_id"])
+            logger.debug(f"Flushed {len(batch)} records.")
+    def get_handle(self, path):
+        handle = self.handles.get(path)
+        if handle is None:
+            handle = open(path, "a", encoding="utf-8")
+            self.handles[path] = handle
+        return handle
+    def write_batch(self, batch):
+        with self.write_lock:
+            version = None
+            if self.store is not None:
+                version = self.store.add_many(batch)
+            else:
+                previous = index_source_token()
+            if self.text_logs:
+                touched = set()
+                for record in batch:
+                    path = LOG_FILE if record["classification"] == "music" else UN_LOG_FILE
+                    self.get_handle(path).write(f"{record['url']} | {record['title']}\n")
+                    touched.add(path)
+                for path in touched:
+                    handle = self.handles[path]
+                    handle.flush()
+                    if WRITER_FSYNC:
+                        os.fsync(handle.fileno())
+            if video_index is not None:
+                video_index.add_many((record["video_id"], record["classification"] == "music") for record in batch)
+                if version is not None:
+                    video_index.advance_token(version - 1, version)
+                else:
+                    video_index.advance_token(previous, index_source_token())
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+        self.close_sync()
+    def close_sync(self):
+        batch, self.buffer = self.buffer, []
+        if batch:
+            self.write_batch(batch)
+            logger.info(f"Drained {len(batch)} buffered records on shutdown.")
+        self.pending_ids.clear()
+        with self.write_lock:
+            for handle in self.handles.values():
+                handle.close()
+            self.handles.clear()
+        self.executor.shutdown(wait=True)
+def get_log_writer():
+    global log_writer
+    if log_writer is None:
+        log_writer = LogWriter(history_store, history_store is None or EXPORT_TEXT_LOGS)
+    return log_writer
+def record_result(canonical_url, info, is_music):
+    record = build_record(canonical_url, info, is_music)
+    title = record["title"]
+    get_log_writer().submit(record)
+    if is_music:
+        logger.info(f"Logged MUSIC URL: {canonical_url} | Title: {title}")
+        print(f"Logged MUSIC: {canonical_url} | {title}")
+    else:
+        logger.info(f"Logged NON-MUSIC URL: {canonical_url} | Title: {title}")
+        print(f"Logged NON-MUSIC: {canonical_url} | {title}")
+async def process_job(job):
+    canonical_url = job.canonical_url
+    logger.debug(f"Processing new URL: {canonical_url}")
+    print(f"Processing new URL: {canonical_url}")
+    started = time.perf_counter()
+    job.trace["queue_wait"] = started - job.submitted_at
+    info = await lookup_metadata(canonical_url)
+    job.trace["lookup"] = time.perf_counter() - started
+    if not info:
+        metrics.inc("ytlogger_lookup_failures_total")
+        logger.warning(f"Failed to get video info for {canonical_url}")
+        return None
+    started = time.perf_counter()
+    is_music = is_music_video(info)
+    job.trace["classify"] = time.perf_counter() - started
+    classification = "music" if is_music else "non_music"
+    metrics.observe("ytlogger_classify_seconds", job.trace["classify"])
+    metrics.inc("ytlogger_classified_total", classification=classification)
+    started = time.perf_counter()
+    record_result(canonical_url, info, is_music)
+    job.trace["record"] = time.perf_counter() - started
+    metrics.observe("ytlogger_job_seconds", time.perf_counter() - job.submitted_at)
+    if TRACE_URLS:
+        logger.info(f"Trace {canonical_url}: " + ", ".join(f"{stage}={seconds * 1000:.2f}ms" for stage, seconds in job.trace.items()))
+    return classification
+async def submit_url(canonical_url, owner=None):
+    video_id = video_id_from_url(canonical_url)
+    job = in_flight.get(video_id)
+    if job is not None:
+        metrics.inc("ytlogger_duplicates_total", stage="in_flight")
+        logger.info(f"URL already in flight: {canonical_url}. Waiting for pending lookup.")
+        job.owners.add(owner)
+        return job
+    job = UrlJob(canonical_url)
+    job.owners.add(owner)
+    in_flight[video_id] = job
+    await url_queue.put(job)
+    return job
+def filter_unprocessed(canonical_urls):
+    video_ids = [video_id_from_url(url) for url in canonical_urls]
+    if video_index is not None:
+        known_ids = video_index.known_ids(video_ids)
+    elif history_store is not None:
+        known_ids = history_store.known_ids(video_ids)
+    else:
+        known_ids = set()
+    if log_writer is not None:
+        known_ids |= log_writer.pending_ids
+    return [url for url, video_id in zip(canonical_urls, video_ids) if video_id not in known_ids]
+async def submit_batch(urls, owner=None, outcomes=None):
+    await wait_for_history()
+    summary = {"received": len(urls), "invalid": 0, "repeated": 0, "known": 0, "in_flight": 0, "queued": 0}
+    canonical_urls = {}
+    entry_urls = []
+    for url in urls:
+        canonical_url = await canonicalize_youtube_url(url) if isinstance(url, str) else None
+        entry_urls.append(canonical_url)
+        if not canonical_url:
+            summary["invalid"] += 1
+        elif canonical_url in canonical_urls:
+            summary["repeated"] += 1
+        else:
+            canonical_urls[canonical_url] = url
+    pending = filter_unprocessed(list(canonical_urls))
+    summary["known"] = len(canonical_urls) - len(pending)
+    metrics.inc("ytlogger_duplicates_total", summary["known"], stage="known")
+    metrics.inc("ytlogger_duplicates_total", summary["repeated"], stage="batch_repeat")
+    jobs = {}
+    for canonical_url in pending:
+        if video_id_from_url(canonical_url) in in_flight:
+            summary["in_flight"] += 1
+        else:
+            summary["queued"] += 1
+        jobs[canonical_url] = await submit_url(canonical_url, owner)
+    if outcomes is not None:
+        for canonical_url in entry_urls:
+            outcomes.append("invalid" if canonical_url is None else jobs.get(canonical_url, "duplicate"))
+    logger.info(f"Batch of {summary['received']} URLs: {summary['queued']} queued, {summary['in_flight']} in flight, {summary['known']} already processed, {summary['repeated']} repeated, {summary['invalid']} invalid.")
+    return summary
+def release_client_jobs(owner):
+    for video_id, job in list(in_flight.items()):
+        job.owners.discard(owner)
+        if job.owners:
+            continue
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            job.future.cancel()
+        in_flight.pop(video_id, None)
+        logger.info(f"Cancelled pending lookup for {job.canonical_url}: client disconnected.")
+async def pipeline_worker(worker_id):
+    while True:
+        job = await url_queue.get()
+        try:
+            if job.future.done():
+                continue
+            job.task = asyncio.create_task(process_job(job))
+            try:
+                await asyncio.wait({job.task})
+            except asyncio.CancelledError:
+                job.task.cancel()
+                raise
+            if job.task.cancelled():
+                job.future.cancel()
+            elif job.task.exception() is not None:
+                logger.error(f"Pipeline worker {worker_id} failed on {job.canonical_url}: {job.task.exception()}", exc_info=job.task.exception())
+                job.error = True
+                job.future.set_result(None)
+            else:
+                job.future.set_result(job.task.result())
+        finally:
+            if in_flight.get(job.video_id) is job:
+                del in_flight[job.video_id]
+            url_queue.task_done()
+def start_pipeline():
+    global url_queue
+    if pipeline_tasks:
+        return
+    url_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    for worker_id in range(PIPELINE_WORKERS):
+        pipeline_tasks.append(asyncio.create_task(pipeline_worker(worker_id)))
+    logger.info(f"Started URL pipeline with {PIPELINE_WORKERS} workers.")
 async def safe_reboot():
     try:
         await reboot_servers()
@@ -178,6 +1001,7 @@ async def safe_reboot():
         print(f"Error during reboot: {e}")
 async def reboot_servers():
     global running_servers, successful_port
+    metrics.inc("ytlogger_reboots_total")
     logger.info("Shutting down all servers for reboot.")
     shutdown_tasks = []
     for port, server_obj in running_servers.items():
@@ -186,10 +1010,218 @@ async def reboot_servers():
     await asyncio.gather(*shutdown_tasks, return_exceptions=True)
     running_servers.clear()
     successful_port = None
+    if log_writer is not None:
+        await log_writer.flush()
+    if metadata_cache is not None:
+        metadata_cache.save()
+    save_video_index()
     await asyncio.sleep(1)  
     logger.info("Restarting all servers after reboot.")
     print("Restarting all servers...")
     await start_servers()
+def current_gauges():
+    clients = len(connected_clients) if MULTI_CLIENT else int(active_client_websocket is not None)
+    return {
+        "ytlogger_queue_depth": url_queue.qsize() if url_queue is not None else 0,
+        "ytlogger_in_flight": len(in_flight),
+        "ytlogger_clients": clients,
+        "ytlogger_cache_entries": len(metadata_cache.entries) if metadata_cache is not None else 0,
+        "ytlogger_writer_pending": len(log_writer.buffer) if log_writer is not None else 0,
+        "ytlogger_index_entries": len(video_index) if video_index is not None else 0,
+    }
+async def handle_metrics_request(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if line in (b"\r\n", b"\n", b""):
+                break
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+            status, body = "200 OK", metrics.render(current_gauges()).encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"Not Found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.debug(f"Error serving metrics request: {e}")
+    finally:
+        writer.close()
+async def start_metrics_server(event_queue=None):
+    if not METRICS_PORT:
+        return None
+    try:
+        server = await asyncio.start_server(handle_metrics_request, METRICS_HOST, METRICS_PORT)
+    except OSError as e:
+        logger.error(f"Failed to start metrics endpoint on {METRICS_HOST}:{METRICS_PORT}: {e}")
+        return None
+    logger.info(f"Metrics endpoint on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    if event_queue:
+        await event_queue.put(f"Metrics endpoint on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return server
+def queue_status():
+    depth = url_queue.qsize() if url_queue is not None else 0
+    return {
+        "queue_depth": depth,
+        "queue_capacity": PIPELINE_QUEUE_SIZE,
+        "active": len(in_flight),
+        "saturated": depth >= PIPELINE_QUEUE_SIZE * SATURATION_RATIO,
+    }
+async def send_json(websocket, payload):
+    try:
+        await websocket.send(json.dumps(payload))
+    except websockets.exceptions.ConnectionClosed:
+        logger.debug(f"Could not send {payload.get('type')} for {payload.get('id')}: connection closed.")
+async def send_ack(websocket, request_id, status):
+    if request_id is not None:
+        await send_json(websocket, {"type": "ack", "id": request_id, "status": status, **queue_status()})
+def track_result(websocket, request_id, job):
+    if request_id is None:
+        return
+    def send_result(future):
+        if future.cancelled():
+            return
+        classification = future.result()
+        payload = {
+            "type": "result",
+            "id": request_id,
+            "status": "logged" if classification else "error" if job.error else "failed",
+            "classification": classification,
+            **queue_status(),
+        }
+        if TRACE_URLS:
+            payload["trace"] = {stage: round(seconds * 1000, 3) for stage, seconds in job.trace.items()}
+        asyncio.ensure_future(send_json(websocket, payload))
+    job.future.add_done_callback(send_result)
+async def handle_batch_message(websocket, entries):
+    request_ids = []
+    urls = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            request_ids.append(entry.get("id"))
+            urls.append(entry.get("url"))
+        else:
+            request_ids.append(None)
+            urls.append(entry)
+    outcomes = []
+    summary = await submit_batch(urls, websocket, outcomes)
+    acks = []
+    for request_id, outcome in zip(request_ids, outcomes):
+        if request_id is None:
+            continue
+        if isinstance(outcome, UrlJob):
+            acks.append({"id": request_id, "status": "queued"})
+            track_result(websocket, request_id, outcome)
+        else:
+            acks.append({"id": request_id, "status": outcome})
+    print(f"Batch received: {summary['queued']} queued, {summary['known']} already processed.")
+    await send_json(websocket, {
+        "type": "batch_summary",
+        "message": f"Batch received: {summary['queued']} queued, {summary['known']} already processed.",
+        **summary,
+        "acks": acks,
+        **queue_status(),
+    })
+async def handle_client_message(websocket, message, client_addr, current_port):
+    try:
+        data = json.loads(message)
+    except json.JSONDecodeError:
+        logger.warning(f"Invalid JSON received on port {current_port} from {client_addr}.")
+        return
+    if isinstance(data, dict) and isinstance(data.get("urls"), list):
+        await handle_batch_message(websocket, data["urls"])
+        return
+    if isinstance(data, dict) and data.get("type") == "metrics":
+        await send_json(websocket, {"type": "metrics", **metrics.snapshot(current_gauges())})
+        return
+    request_id = data.get("id") if isinstance(data, dict) else None
+    url = data.get("url") if isinstance(data, dict) else None
+    if not url:
+        logger.warning(f"Received message with no 'url' field on port {current_port} from {client_addr}.")
+        await send_ack(websocket, request_id, "invalid")
+        return
+    canonical_url = await canonicalize_youtube_url(url)
+    if not canonical_url:
+        logger.warning(f"Could not canonicalize URL from {client_addr}: {url}")
+        await send_ack(websocket, request_id, "invalid")
+        return
+    await wait_for_history()
+    if is_processed(canonical_url):
+        metrics.inc("ytlogger_duplicates_total", stage="known")
+        logger.info(f"URL already processed: {canonical_url}. Skipping.")
+        print(f"Already processed: {canonical_url}")
+        await send_ack(websocket, request_id, "duplicate")
+        return
+    job = await submit_url(canonical_url, websocket)
+    await send_ack(websocket, request_id, "queued")
+    track_result(websocket, request_id, job)
+def is_valid_code(message):
+    return isinstance(message, str) and hmac.compare_digest(message.encode("utf-8"), EXPECTED_CODE.encode("utf-8"))
+def is_loopback_host(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+async def multi_client_handler(websocket, event_queue=None):
+    client_addr = websocket.remote_address
+    current_port = websocket.local_address[1]
+    logger.info(f"Multi-client handler started for connection to port {current_port} from {client_addr}")
+    registered = False
+    try:
+        try:
+            message = await asyncio.wait_for(websocket.recv(), timeout=15)
+        except asyncio.TimeoutError:
+            logger.warning(f"Handshake timeout on port {current_port} from {client_addr}. Closing connection.")
+            try:
+                 await websocket.send(json.dumps({"message": "Handshake timeout."}))
+            except Exception: pass
+            await websocket.close()
+            return
+        if not is_valid_code(message):
+            logger.warning(f"Invalid connection code received on port {current_port} from {client_addr}: '{message}'. Closing connection.")
+            try:
+                 await websocket.send(json.dumps({"message": "Invalid code, closing connection."}))
+            except Exception: pass
+            await websocket.close()
+            if event_queue:
+                await event_queue.put(f"Invalid code received from {client_addr}. Closing.")
+            return
+        if len(connected_clients) >= MAX_CLIENTS:
+            metrics.inc("ytlogger_connections_total", event="rejected")
+            logger.warning(f"Connection from {client_addr} rejected: {MAX_CLIENTS} clients already connected.")
+            try:
+                await websocket.send(json.dumps({"message": f"Server is full ({MAX_CLIENTS} clients). Connection rejected."}))
+            except Exception: pass
+            await websocket.close()
+            return
+        connected_clients.add(websocket)
+        registered = True
+        metrics.inc("ytlogger_connections_total", event="connected")
+        logger.info(f"Client {client_addr} authenticated on port {current_port} ({len(connected_clients)} connected).")
+        if event_queue:
+            await event_queue.put(f"Client {client_addr} connected ({len(connected_clients)} connected).")
+        await websocket.send(json.dumps({"message": f"Connection established with server on port {current_port}.", "clients": len(connected_clients)}))
+        async for message in websocket:
+            await handle_client_message(websocket, message, client_addr, current_port)
+    except websockets.exceptions.ConnectionClosedOK:
+        logger.info(f"Client on port {current_port} disconnected normally: {client_addr}")
+    except websockets.exceptions.ConnectionClosedError as e:
+        logger.info(f"Client on port {current_port} disconnected with error: {client_addr} (Code: {e.code}, Reason: {e.reason})")
+    except Exception as e:
+        logger.error(f"Unexpected error in handler for {client_addr} on port {current_port}: {e}", exc_info=True)
+    finally:
+        release_client_jobs(websocket)
+        if registered:
+            metrics.inc("ytlogger_connections_total", event="disconnected")
+            connected_clients.discard(websocket)
+            logger.info(f"Client {client_addr} disconnected ({len(connected_clients)} connected).")
+            if event_queue:
+                await event_queue.put(f"Client {client_addr} disconnected ({len(connected_clients)} connected).")
 async def handler(websocket, event_queue=None):
     global successful_port, connection_established_event, running_servers
     client_addr = websocket.remote_address
@@ -202,6 +1234,7 @@ async def handler(websocket, event_queue=None):
             message = await asyncio.wait_for(websocket.recv(), timeout=15)
             global active_client_websocket
             if active_client_websocket is not None:
+                metrics.inc("ytlogger_connections_total", event="rejected")
                 logger.warning(f"Connection attempt rejected on port {current_port} - another client is already connected.")
                 try:
                     await websocket.send(json.dumps({"message": "Only one client allowed. Connection rejected."}))
@@ -225,7 +1258,7 @@ async def handler(websocket, event_queue=None):
             if event_queue:
                 await event_queue.put(f"Connection closed by client during handshake on port {current_port}: {client_addr}")
             return
-        if message == EXPECTED_CODE:
+        if is_valid_code(message):
             if connection_established_event.is_set():
                 if successful_port != current_port:
                      logger.warning(f"Valid connection code received on port {current_port} from {client_addr}, but primary is already on port {successful_port}. Closing this connection.")
@@ -243,6 +1276,7 @@ async def handler(websocket, event_queue=None):
                 if event_queue:
                     await event_queue.put(f"Primary connection established on port {current_port}.")
                 active_client_websocket = websocket
+                metrics.inc("ytlogger_connections_total", event="connected")
                 await websocket.send(json.dumps({"message": f"Connection established with primary server on port {current_port}."}))
             async for message in websocket:
                 if connection_established_event.is_set() and websocket.local_address[1] != successful_port:
@@ -254,42 +1288,7 @@ async def handler(websocket, event_queue=None):
                     if event_queue:
                         await event_queue.put(f"Received message on non-primary port {current_port}. Closing.")
                     return
-                try:
-                    data = json.loads(message)
-                except json.JSONDecodeError:
-                    logger.warning(f"Invalid JSON received on port {current_port} from {client_addr}.")
-                    continue
-                url = data.get("url")
-                if not url:
-                    logger.warning(f"Received message with no 'url' field on port {current_port} from {client_addr}.")
-                    continue
-                canonical_url = await canonicalize_youtube_url(url)
-                if not canonical_url:
-                    logger.warning(f"Could not canonicalize URL from {client_addr}: {url}")
-                    continue
-                if canonical_url in logged_links or canonical_url in un_logged_links:
-                    logger.info(f"URL already processed: {canonical_url}. Skipping.")
-                    print(f"Already processed: {canonical_url}")
-                    continue
-                logger.debug(f"Processing new URL: {canonical_url}")
-                print(f"Processing new URL: {canonical_url}")
-                info = await extract_info(canonical_url)
-                if not info:
-                    logger.warning(f"Failed to get video info for {canonical_url}")
-                    continue
-                title = info.get("title", "Unknown Title")
-                if is_music_video(info):
-                    with open(LOG_FILE, "a", encoding="utf-8") as f:
-                        f.write(f"{canonical_url} | {title}\n")
-                    logged_links.add(canonical_url)
-                    logger.info(f"Logged MUSIC URL: {canonical_url} | Title: {title}")
-                    print(f"Logged MUSIC: {canonical_url} | {title}")
-                else:
-                    with open(UN_LOG_FILE, "a", encoding="utf-8") as f:
-                        f.write(f"{canonical_url} | {title}\n")
-                    un_logged_links.add(canonical_url)
-                    logger.info(f"Logged NON-MUSIC URL: {canonical_url} | Title: {title}")
-                    print(f"Logged NON-MUSIC: {canonical_url} | {title}")
+                await handle_client_message(websocket, message, client_addr, current_port)
         else:
             logger.warning(f"Invalid connection code received on port {current_port} from {client_addr}: '{message}'. Closing connection.")
             try:
@@ -312,14 +1311,31 @@ async def handler(websocket, event_queue=None):
         if event_queue:
             await event_queue.put(f"Unexpected error in handler for {client_addr} on port {current_port}.")
     finally:
+        release_client_jobs(websocket)
         logger.info(f"Handler for client {client_addr} on port {current_port} finished.")
         if active_client_websocket == websocket:
+            metrics.inc("ytlogger_connections_total", event="disconnected")
             logger.info(f"Primary client disconnected. Triggering reboot of all ports.")
             if event_queue:
                 await event_queue.put(f"Primary client disconnected. Rebooting servers...")
             active_client_websocket = None
             connection_established_event.clear()
             asyncio.create_task(safe_reboot())
+async def drain_and_stop(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    pipeline_tasks.clear()
+    try:
+        if log_writer is not None:
+            await log_writer.close()
+    except Exception as e:
+        logger.error(f"Error draining log writer before shutdown: {e}", exc_info=True)
+def request_shutdown(loop):
+    try:
+        loop.call_soon_threadsafe(shutdown_event.set)
+    except RuntimeError:
+        pass
 def listen_for_quit(loop):
     print("\nPress 'q' and Enter to shut down the server.")
     try:
@@ -329,16 +1345,16 @@ def listen_for_quit(loop):
                 if user_input == 'q':
                     logger.info("Shortcut 'q' pressed. Shutting down server...")
                     print("Shortcut 'q' pressed. Shutting down server...")
-                    loop.call_soon_threadsafe(loop.stop)
+                    request_shutdown(loop)
                     break
             except (EOFError, KeyboardInterrupt):
                 logger.warning("Input stream closed or KeyboardInterrupt in listener thread. Shutting down.")
                 print("Input stream closed or KeyboardInterrupt. Shutting down.")
-                loop.call_soon_threadsafe(loop.stop)
+                request_shutdown(loop)
                 break
             except Exception as e:
                 logger.error(f"Error reading input in listen_for_quit thread: {e}", exc_info=True)
-                loop.call_soon_threadsafe(loop.stop)
+                request_shutdown(loop)
                 break
     finally:
         logger.info("Quit listener thread finished.")
@@ -360,20 +1376,48 @@ async def start_servers(event_queue=None):
             if event_queue:
                 await event_queue.put(f"Server started on ws://127.0.0.1:{port}")
             logger.info(f"Server started on ws://127.0.0.1:{port}")
+async def start_persistent_server(event_queue=None):
+    global successful_port
+    for port in PORTS_TO_TRY:
+        try:
+            server_obj = await websockets.serve(lambda ws, q=event_queue: multi_client_handler(ws, q), MULTI_CLIENT_HOST, port)
+        except OSError as e:
+            logger.error(f"Failed to start server on port {port}: {e}")
+            if event_queue:
+                await event_queue.put(f"Failed to start server on port {port}: {e}")
+            continue
+        running_servers[port] = server_obj
+        successful_port = port
+        logger.info(f"Multi-client server started on ws://{MULTI_CLIENT_HOST}:{port}")
+        if event_queue:
+            await event_queue.put(f"Multi-client server listening on ws://{MULTI_CLIENT_HOST}:{port} (up to {MAX_CLIENTS} clients).")
+        return server_obj
+    return None
+async def run_multi_client(event_queue):
+    while True:
+        server_obj = await start_persistent_server(event_queue)
+        if server_obj is None:
+            logger.critical("No servers could be started on any of the specified ports. Retrying in 5s...")
+            await event_queue.put("No servers could start; retrying in 5 seconds...")
+            await asyncio.sleep(5)
+            continue
+        try:
+            await server_obj.wait_closed()
+        except Exception as e:
+            logger.error(f"Error waiting for multi-client server to close: {e}", exc_info=True)
+        running_servers.clear()
 async def print_event_consumer(event_queue):
     while True:
         msg = await event_queue.get()
         print(msg)
         event_queue.task_done()
-async def main():
+async def run_servers(event_queue):
     global successful_port, running_servers, connection_established_event
-    loop = asyncio.get_running_loop()
-    event_queue = asyncio.Queue()
-    consumer_task = asyncio.create_task(print_event_consumer(event_queue))
-    await event_queue.put("\nPress 'q' and Enter to shut down the server.")
-    threading.Thread(target=listen_for_quit, args=(loop,), daemon=True).start()
+    restarted = False
     while True:
-        clear_console()  
+        if restarted:
+            clear_console()
+        restarted = True
         connection_established_event = asyncio.Event()
         successful_port = None
         running_servers.clear()
@@ -399,9 +1443,218 @@ async def main():
             await running_servers[successful_port].wait_closed()
         except Exception as e:
             logger.error(f"Error waiting for primary server to close: {e}", exc_info=True)
+async def main():
+    loop = asyncio.get_running_loop()
+    event_queue = asyncio.Queue()
+    consumer_task = asyncio.create_task(print_event_consumer(event_queue))
+    await event_queue.put("\nPress 'q' and Enter to shut down the server.")
+    threading.Thread(target=listen_for_quit, args=(loop,), daemon=True).start()
+    start_pipeline()
+    history_task = asyncio.create_task(load_history_in_background(event_queue))
+    await start_metrics_server(event_queue)
+    serve_task = asyncio.create_task(run_multi_client(event_queue) if MULTI_CLIENT else run_servers(event_queue))
+    shutdown_task = asyncio.create_task(shutdown_event.wait())
+    try:
+        await asyncio.wait({serve_task, shutdown_task}, return_when=asyncio.FIRST_COMPLETED)
+        if serve_task.done():
+            serve_task.result()
+    finally:
+        await drain_and_stop([serve_task, shutdown_task, history_task, *pipeline_tasks, consumer_task])
+HISTORY_URL_PATTERN = re.compile(r'(?:https?://)?(?:[\w-]+\.)?(?:youtube\.com|youtu\.be)/[^\s"\'<>|,]+')
+def iter_json_urls(node):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if isinstance(value, str) and key.lower() in ("url", "uri", "href", "titleurl"):
+                yield value
+            else:
+                yield from iter_json_urls(value)
+    elif isinstance(node, list):
+        for item in node:
+            if isinstance(item, str):
+                yield item
+            else:
+                yield from iter_json_urls(item)
+def iter_sqlite_history_urls(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "moz_places" in tables:
+            query = "SELECT url FROM moz_places WHERE url LIKE '%youtu%' ORDER BY last_visit_date"
+        elif "urls" in tables:
+            query = "SELECT url FROM urls WHERE url LIKE '%youtu%' ORDER BY last_visit_time"
+        else:
+            raise ValueError(f"{path} is not a Firefox or Chrome history database.")
+        for (url,) in conn.execute(query):
+            yield url
+    finally:
+        conn.close()
+def iter_source_urls(source):
+    if source == "-":
+        for line in sys.stdin:
+            yield from HISTORY_URL_PATTERN.findall(line)
+        return
+    with open(source, "rb") as f:
+        header = f.read(16)
+    if header.startswith(b"SQLite format 3"):
+        yield from iter_sqlite_history_urls(source)
+        return
+    with open(source, "r", encoding="utf-8", errors="replace") as f:
+        first = f.read(1)
+        f.seek(0)
+        if first in ("[", "{"):
+            yield from iter_json_urls(json.load(f))
+            return
+        for line in f:
+            yield from HISTORY_URL_PATTERN.findall(line)
+def take_chunk(iterator, size):
+    chunk = []
+    for url in iterator:
+        chunk.append(url)
+        if len(chunk) >= size:
+            break
+    return chunk
+def apply_worker_count(workers):
+    global EXTRACT_WORKERS, PIPELINE_WORKERS
+    if workers and workers > 0:
+        EXTRACT_WORKERS = workers
+        PIPELINE_WORKERS = workers
+def format_ingest_progress(stats, started_at):
+    elapsed = max(time.perf_counter() - started_at, 1e-9)
+    done = stats["music"] + stats["non_music"] + stats["failed"]
+    return (f"[ingest] read {stats['read']} | queued {stats['queued']} | done {done} "
+            f"(music {stats['music']}, non-music {stats['non_music']}, failed {stats['failed']}) | "
+            f"known {stats['known']} | invalid {stats['invalid']} | {done / elapsed:.1f} URLs/s | {elapsed:.0f}s")
+async def report_ingest_progress(stats, started_at):
+    while True:
+        await asyncio.sleep(INGEST_PROGRESS_INTERVAL)
+        print(format_ingest_progress(stats, started_at))
+async def run_ingest(source, workers=None):
+    apply_worker_count(workers)
+    stats = {"read": 0, "invalid": 0, "known": 0, "queued": 0, "music": 0, "non_music": 0, "failed": 0}
+    tracked = set()
+    def count_result(future):
+        if future.cancelled():
+            return
+        stats[future.result() or "failed"] += 1
+    get_metadata_cache()
+    get_classifier()
+    start_pipeline()
+    writer = get_log_writer()
+    writer.start()
+    await start_metrics_server()
+    started_at = time.perf_counter()
+    logger.info(f"Ingest started from {source} with {PIPELINE_WORKERS} workers.")
+    print(f"Ingesting URLs from {'stdin' if source == '-' else source} with {PIPELINE_WORKERS} workers...")
+    progress_task = asyncio.create_task(report_ingest_progress(stats, started_at))
+    urls = iter_source_urls(source)
+    try:
+        while True:
+            chunk = await asyncio.to_thread(take_chunk, urls, INGEST_CHUNK_SIZE)
+            if not chunk:
+                break
+            outcomes = []
+            summary = await submit_batch(chunk, "ingest", outcomes)
+            stats["read"] += summary["received"]
+            stats["invalid"] += summary["invalid"]
+            stats["known"] += summary["known"] + summary["repeated"] + summary["in_flight"]
+            stats["queued"] += summary["queued"]
+            for job in outcomes:
+                if isinstance(job, UrlJob) and job.video_id not in tracked:
+                    tracked.add(job.video_id)
+                    job.future.add_done_callback(count_result)
+        await url_queue.join()
+    finally:
+        progress_task.cancel()
+        await writer.close()
+        print(format_ingest_progress(stats, started_at))
+        logger.info(format_ingest_progress(stats, started_at))
+def reclassify_history(dry_run=False):
+    if history_store is None:
+        print(f"Reclassification needs the SQLite history store (STORAGE_BACKEND = '{STORAGE_BACKEND}').")
+        return
+    engine = get_classifier()
+    cache = get_metadata_cache()
+    cached = dict(cache.items())
+    started_at = time.perf_counter()
+    stats = {"checked": 0, "skipped": 0, "to_music": 0, "to_non_music": 0}
+    changes = []
+    batch = []
+    def flush_batch():
+        results = engine.classify_many([info for _, info in batch])
+        for (record, _), result in zip(batch, results):
+            classification = "music" if result.is_music else "non_music"
+            if classification != record["classification"]:
+                changes.append((classification, record["video_id"]))
+                stats["to_" + classification] += 1
+                logger.info(f"Reclassified {record['url']} as {classification.upper()} (rule {result.rule}, score {result.score}) | {record['title']}")
+        stats["checked"] += len(batch)
+        batch.clear()
+    for record in history_store.iter_records():
+        info = record["metadata"] if "title" in record["metadata"] else cached.get(record["video_id"])
+        if not info:
+            stats["skipped"] += 1
+            continue
+        batch.append((record, info))
+        if len(batch) >= RECLASSIFY_CHUNK_SIZE:
+            flush_batch()
+    if batch:
+        flush_batch()
+    elapsed = max(time.perf_counter() - started_at, 1e-9)
+    print(f"Reclassified {stats['checked']} videos in {elapsed:.2f}s ({stats['checked'] / elapsed:.0f}/s): "
+          f"{stats['to_music']} now music, {stats['to_non_music']} now non-music, {stats['skipped']} skipped without stored metadata.")
+    if dry_run or not changes:
+        return
+    version = history_store.update_classifications(changes)
+    if video_index is not None:
+        video_index.add_many((video_id, classification == "music") for classification, video_id in changes)
+        video_index.advance_token(version - 1, version)
+    logger.info(f"Applied {len(changes)} classification changes.")
+    if EXPORT_TEXT_LOGS:
+        export_text_logs()
+def export_text_logs():
+    if history_store is None:
+        print(f"History store is not enabled (STORAGE_BACKEND = '{STORAGE_BACKEND}'); nothing to export.")
+        return
+    counts = history_store.export_text_logs(LOG_FILE, UN_LOG_FILE)
+    logger.info(f"Exported {counts['music']} music and {counts['non_music']} non-music entries to {LOG_FILE}/{UN_LOG_FILE}.")
+    print(f"Exported {counts['music']} entries to {LOG_FILE} and {counts['non_music']} entries to {UN_LOG_FILE}.")
+def parse_args():
+    parser = argparse.ArgumentParser(description="YouTube Logger WebSocket server.")
+    parser.add_argument("--export-text", action="store_true", help=f"write {LOG_FILE} and {UN_LOG_FILE} from {DB_FILE} and exit")
+    parser.add_argument("--ingest", metavar="SOURCE", help="process URLs from a text/CSV/HTML file, a JSON or SQLite browser-history export, or '-' for stdin, then exit")
+    parser.add_argument("--reclassify", action="store_true", help="re-run classification over stored metadata without network calls, then exit")
+    parser.add_argument("--dry-run", action="store_true", help="with --reclassify, report changes without writing them")
+    parser.add_argument("--workers", type=int, help=f"parallel lookups (default: {EXTRACT_WORKERS})")
+    parser.add_argument("--multi-client", action="store_true", help="keep one persistent listener and accept several authenticated clients at once")
+    parser.add_argument("--host", default=MULTI_CLIENT_HOST, help=f"listen address for --multi-client (default: {MULTI_CLIENT_HOST}); anything but loopback needs --code")
+    parser.add_argument("--code", default=os.environ.get("YTLOGGER_CODE") or EXPECTED_CODE, help="handshake code clients must send (default: $YTLOGGER_CODE, else the built-in code)")
+    parser.add_argument("--metrics-port", type=int, help=f"serve Prometheus metrics on http://{METRICS_HOST}:PORT/metrics")
+    parser.add_argument("--trace", action="store_true", help="log per-stage timings for every processed URL and include them in result messages")
+    args = parser.parse_args()
+    if args.multi_client and not is_loopback_host(args.host) and args.code == DEFAULT_CODE:
+        parser.error(f"--host {args.host} accepts connections from other machines, but the handshake code is the public default; set a private one with --code or YTLOGGER_CODE")
+    return args
 if __name__ == "__main__":
+    args = parse_args()
+    METRICS_PORT = args.metrics_port or METRICS_PORT
+    TRACE_URLS = args.trace or TRACE_URLS
+    EXPECTED_CODE = args.code
     try:
-        asyncio.run(main())
+        if args.export_text or args.reclassify or args.ingest:
+            load_history()
+            history_ready.set()
+        if args.export_text:
+            export_text_logs()
+        elif args.reclassify:
+            reclassify_history(args.dry_run)
+        elif args.ingest:
+            asyncio.run(run_ingest(args.ingest, args.workers))
+        else:
+            apply_worker_count(args.workers)
+            if args.multi_client:
+                MULTI_CLIENT = True
+                MULTI_CLIENT_HOST = args.host
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Server interrupted by user (Ctrl+C) outside asyncio.run block.")
         print("Server interrupted by user (Ctrl+C).")
@@ -409,4 +1662,14 @@ if __name__ == "__main__":
         logger.critical(f"An unhandled exception occurred at the top level: {e}", exc_info=True)
         print(f"An unhandled exception occurred: {e}")
     finally:
+        shutdown_extract_executor()
+        if log_writer is not None:
+            log_writer.close_sync()
+        if metadata_cache is not None:
+            metadata_cache.save()
+        save_video_index()
+        if video_index is not None:
+            video_index.close()
+        if history_store is not None:
+            history_store.close()
         print("Exiting server...")
@@ -0,0 +1,88 @@
+import os
+import random
+import pytest
+from music_classifier import MUSIC_KEYWORDS, load_classifier
+RULES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "music_rules.json")
+WORDS = MUSIC_KEYWORDS + [
+    "music", "Music", "MUSIC", "musical", "lyric", "Lyrics", "MV", "mvp", "Remix", "ft", "feat.", "Official Video",
+    "album", " album ", "albums", " single ", "singles", " stream now ", "music video", "official artist channel",
+    "VEVO", "vevo", "Topic", "topical", "Gaming", "Entertainment", "People & Blogs", "tutorial", "vlog", "news",
+    "cat", "ÄUDIO", "", " ", "\x00", "a\x00b",
+]
+def legacy_is_music(info):
+    try:
+        if info is None:
+            return False
+        if 'entries' in info and info.get('_type') == 'playlist':
+            if info['entries']:
+                info = info['entries'][0]
+            else:
+                return False
+        if not isinstance(info, dict):
+            return False
+        title = info.get('title', '').lower()
+        tags = [str(tag).lower() for tag in info.get('tags', []) if tag is not None] if isinstance(info.get('tags'), list) else []
+        description = str(info.get('description', '')).lower() if info.get('description') is not None else ''
+        categories = [str(cat).lower() for cat in info.get('categories', []) if cat is not None] if isinstance(info.get('categories'), list) else []
+        channel = str(info.get('channel', '')).lower() if info.get('channel') is not None else ''
+        if any(keyword in title for keyword in MUSIC_KEYWORDS):
+            return True
+        if any('music' in tag or tag in MUSIC_KEYWORDS for tag in tags):
+            return True
+        desc_keywords = [' album ', ' single ', ' stream now ', 'music video']
+        if any(keyword in description for keyword in desc_keywords):
+            return True
+        if any('music' in category for category in categories):
+            return True
+        if 'vevo' in channel or 'official artist channel' in description or 'topic' in channel:
+            return True
+        return False
+    except Exception:
+        return False
+def random_text(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randrange(count)))
+def random_list(rng):
+    choice = rng.random()
+    if choice < 0.1:
+        return None
+    if choice < 0.15:
+        return "music"
+    return [rng.choice([rng.choice(WORDS), random_text(rng, 3), None, 7]) for _ in range(rng.randrange(5))]
+def random_info(rng):
+    info = {}
+    if rng.random() < 0.95:
+        info["title"] = random_text(rng, 6)
+    for field in ("tags", "categories"):
+        value = random_list(rng)
+        if value is not None:
+            info[field] = value
+    for field in ("description", "channel"):
+        if rng.random() < 0.9:
+            info[field] = rng.choice([random_text(rng, 12), None, 42])
+    if rng.random() < 0.05:
+        return {"_type": "playlist", "entries": [info] if rng.random() < 0.8 else []}
+    return info
+def random_records(seed, count):
+    rng = random.Random(seed)
+    records = [random_info(rng) for _ in range(count)]
+    records[::97] = [None] * len(records[::97])
+    return records
+@pytest.fixture(params=["builtin", "rules_file"])
+def classifier(request):
+    return load_classifier(RULES_FILE if request.param == "rules_file" else None)
+def test_classify_matches_legacy_heuristics(classifier):
+    records = random_records(8, 20000)
+    mismatches = [info for info in records if classifier.classify(info).is_music != legacy_is_music(info)]
+    assert mismatches == []
+def test_classify_many_matches_classify(classifier):
+    records = random_records(13, 5000)
+    assert classifier.classify_many(records) == [classifier.classify(info) for info in records]
+    assert [result.is_music for result in classifier.classify_many(records)] == [legacy_is_music(info) for info in records]
+def test_classify_reports_matched_rules(classifier):
+    result = classifier.classify({"title": "Song (Official Video)", "channel": "ArtistVEVO"})
+    assert result.is_music
+    assert result.score == 2.0
+    assert set(result.matched) == {"title_keyword", "channel_pattern"}
+    assert classifier.classify({"title": "cooking tutorial"}) == classifier.not_music
+    assert classifier.classify_many([]) == []
+    assert classifier.classify_many([None, {"_type": "playlist", "entries": []}]) == [classifier.not_music] * 2
@@ -0,0 +1,91 @@
+import random
+import pytest
+from video_index import VideoIndex, pack_id
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+LAST_CHARS = "AEIMQUYcgkosw048"
+def random_ids(seed, count):
+    rng = random.Random(seed)
+    return list(dict.fromkeys("".join(rng.choice(ALPHABET) for _ in range(10)) + rng.choice(LAST_CHARS) for _ in range(count)))
+def test_pack_id():
+    assert pack_id("dQw4w9WgXcQ") is not None
+    assert pack_id("AAAAAAAAAAA") == 0
+    assert pack_id("___________") is None
+    assert pack_id("__________w") == (1 << 64) - 1 - 3
+    for last in set(ALPHABET) - set(LAST_CHARS):
+        assert pack_id(f"dQw4w9WgXc{last}") is None
+    for video_id in ("dQw4w9WgXc", "dQw4w9WgXcQQ", "dQw4w9Wg!cQ", "dQw4w9Wg=cQ", "", "dQw4w9WgXcQ\n"):
+        assert pack_id(video_id) is None
+    ids = random_ids(1, 5000)
+    assert len({pack_id(video_id) for video_id in ids}) == len(ids)
+def test_build_save_load_roundtrip(tmp_path):
+    path = str(tmp_path / "history.idx")
+    ids = random_ids(2, 3000)
+    entries = [(video_id, i % 3 == 0) for i, video_id in enumerate(ids)]
+    overflow = [("dQw4w9WgXcB", True), ("short", False)]
+    index = VideoIndex.build(entries + overflow + [(ids[0], False)], token=7)
+    assert len(index) == len(ids) + len(overflow)
+    assert index.get(ids[0]) is False
+    assert index.save(path)
+    assert not index.save(path)
+    index.close()
+    loaded = VideoIndex.load(path, 7)
+    assert loaded.mapping is not None
+    assert loaded.token == 7
+    assert len(loaded) == len(ids) + len(overflow)
+    assert loaded.get(ids[0]) is False
+    assert all(loaded.get(video_id) == is_music for video_id, is_music in entries[1:])
+    assert loaded.get("dQw4w9WgXcB") is True
+    assert loaded.get("short") is False
+    assert loaded.get("zzzzzzzzzzA") is None
+    assert loaded.known_ids([ids[1], "zzzzzzzzzzA", "short"]) == {ids[1], "short"}
+    loaded.close()
+def test_add_many_flag_flip_and_resave(tmp_path):
+    path = str(tmp_path / "history.idx")
+    ids = random_ids(3, 1000)
+    VideoIndex.build(((video_id, False) for video_id in ids), token=1).save(path)
+    index = VideoIndex.load(path, 1)
+    new_ids = random_ids(4, 50)
+    index.add_many([(ids[0], True), (ids[1], False), ("short", True)] + [(video_id, True) for video_id in new_ids])
+    assert index.get(ids[0]) is True
+    assert len(index) == len(set(ids) | set(new_ids)) + 1
+    assert index.advance_token(1, 2)
+    assert not index.advance_token(1, 3)
+    assert index.token == 2
+    assert index.save(path)
+    index.add("short", False)
+    index.close()
+    reloaded = VideoIndex.load(path, 2)
+    assert len(reloaded) == len(set(ids) | set(new_ids)) + 1
+    assert reloaded.get(ids[0]) is True
+    assert reloaded.get(ids[1]) is False
+    assert reloaded.get("short") is True
+    assert all(reloaded.get(video_id) is True for video_id in new_ids)
+    reloaded.close()
+def test_merge_keeps_entries_sorted():
+    ids = random_ids(5, 2000)
+    index = VideoIndex.build((video_id, False) for video_id in ids[:1000])
+    index.merge_threshold = 64
+    index.add_many((video_id, True) for video_id in ids[500:2000])
+    index.merge()
+    assert not index.delta
+    keys, flags = index.base
+    assert len(flags) == len(keys)
+    assert list(keys) == sorted(pack_id(video_id) for video_id in ids)
+    assert len(index) == len(ids)
+    assert all(index.get(video_id) is (i >= 500) for i, video_id in enumerate(ids))
+def test_load_rejects_stale_or_damaged_files(tmp_path):
+    path = str(tmp_path / "history.idx")
+    VideoIndex.build([("dQw4w9WgXcQ", True), ("short", False)], token=5).save(path)
+    with pytest.raises(LookupError):
+        VideoIndex.load(path, 6)
+    VideoIndex.load(path).close()
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:30])
+    with pytest.raises(ValueError):
+        VideoIndex.load(path, 5)
+    with open(path, "wb") as f:
+        f.write(b"NOTANIDX" + data[8:])
+    with pytest.raises(ValueError):
+        VideoIndex.load(path, 5)
@@ -0,0 +1,205 @@
+import base64
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+MAGIC = b"YTVIDX01"
+HEADER = struct.Struct("<8sQQQ")
+PACKABLE_ID = re.compile(r"[A-Za-z0-9_-]{10}[AEIMQUYcgkosw048]")
+MERGE_THRESHOLD = 1 << 16
+def pack_id(video_id):
+    if not PACKABLE_ID.fullmatch(video_id):
+        return None
+    return int.from_bytes(base64.urlsafe_b64decode(video_id + "="), "big")
+def merge_sorted(keys, flags, delta):
+    merged_keys = array("Q")
+    merged_flags = bytearray()
+    start = 0
+    for key in sorted(delta):
+        i = bisect_left(keys, key, start)
+        merged_keys.frombytes(memoryview(keys[start:i]).cast("B"))
+        merged_flags += flags[start:i]
+        merged_keys.append(key)
+        merged_flags.append(delta[key])
+        start = i + 1 if i < len(keys) and keys[i] == key else i
+    merged_keys.frombytes(memoryview(keys[start:]).cast("B"))
+    merged_flags += flags[start:]
+    return merged_keys, merged_flags
+class VideoIndex:
+    def __init__(self, keys=None, flags=None, overflow=None, token=None, merge_threshold=MERGE_THRESHOLD):
+        self.base = (keys if keys is not None else array("Q"), flags if flags is not None else bytearray())
+        self.delta = {}
+        self.replaced = 0
+        self.overflow = dict(overflow or {})
+        self.token = token
+        self.merge_threshold = merge_threshold
+        self.lock = threading.Lock()
+        self.mapping = None
+        self.dirty = False
+    @classmethod
+    def build(cls, entries, token=None):
+        packed = []
+        overflow = {}
+        for video_id, is_music in entries:
+            key = pack_id(video_id)
+            if key is None:
+                overflow[video_id] = bool(is_music)
+            else:
+                packed.append(key << 1 | bool(is_music))
+        packed.sort(key=lambda value: value >> 1)
+        keys = array("Q")
+        flags = bytearray()
+        for value in packed:
+            key = value >> 1
+            if keys and keys[-1] == key:
+                flags[-1] = value & 1
+            else:
+                keys.append(key)
+                flags.append(value & 1)
+        index = cls(keys, flags, overflow, token)
+        index.dirty = True
+        return index
+    def __len__(self):
+        return len(self.base[0]) + len(self.delta) - self.replaced + len(self.overflow)
+    def __contains__(self, video_id):
+        return self.get(video_id) is not None
+    def get(self, video_id):
+        key = pack_id(video_id)
+        if key is None:
+            return self.overflow.get(video_id)
+        flag = self.delta.get(key)
+        if flag is not None:
+            return bool(flag)
+        keys, flags = self.base
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return bool(flags[i])
+        return None
+    def known_ids(self, video_ids):
+        return {video_id for video_id in video_ids if self.get(video_id) is not None}
+    def add(self, video_id, is_music):
+        self.add_many([(video_id, is_music)])
+    def add_many(self, entries):
+        with self.lock:
+            for video_id, is_music in entries:
+                current = self.get(video_id)
+                if current == bool(is_music):
+                    continue
+                key = pack_id(video_id)
+                if key is None:
+                    self.overflow[video_id] = bool(is_music)
+                else:
+                    if current is not None and key not in self.delta:
+                        self.replaced += 1
+                    self.delta[key] = int(bool(is_music))
+                self.dirty = True
+                if len(self.delta) >= self.merge_threshold:
+                    self.merge_locked()
+    def merge(self):
+        with self.lock:
+            self.merge_locked()
+    def merge_locked(self):
+        if self.delta:
+            self.base = merge_sorted(*self.base, self.delta)
+            self.delta = {}
+            self.replaced = 0
+    def advance_token(self, previous, token):
+        with self.lock:
+            if self.token != previous:
+                return False
+            self.token = token
+            self.dirty = True
+            return True
+    def save(self, path, token=None):
+        with self.lock:
+            if token is None:
+                token = self.token
+            if not self.dirty and token == self.token:
+                return False
+            self.merge_locked()
+            if self.mapping is not None:
+                keys, flags = self.base
+                self.base = (array("Q", keys), bytearray(flags))
+                self.close_mapping()
+            keys, flags = self.base
+            if sys.byteorder != "little":
+                keys = array("Q", keys)
+                keys.byteswap()
+            overflow = "".join(f"{int(flag)}{video_id}\n" for video_id, flag in self.overflow.items()).encode("utf-8")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, len(flags), len(self.overflow), token))
+                f.write(keys)
+                f.write(flags)
+                f.write(overflow)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            self.token = token
+            self.dirty = False
+            return True
+    @classmethod
+    def load(cls, path, token=None):
+        f = open(path, "rb")
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            f.close()
+            raise
+        views = []
+        try:
+            if len(mapped) < HEADER.size:
+                raise ValueError(f"{path} is not a video index file or is truncated")
+            magic, count, overflow_count, stored_token = HEADER.unpack_from(mapped, 0)
+            keys_end = HEADER.size + 8 * count
+            flags_end = keys_end + count
+            if magic != MAGIC or len(mapped) < flags_end:
+                raise ValueError(f"{path} is not a video index file or is truncated")
+            if token is not None and stored_token != token:
+                raise LookupError(f"{path} is out of date")
+            view = memoryview(mapped)
+            views.append(view)
+            if sys.byteorder == "little":
+                views.append(view[HEADER.size:keys_end])
+                keys = views[-1].cast("Q")
+                views.append(keys)
+            else:
+                keys = array("Q", bytes(view[HEADER.size:keys_end]))
+                keys.byteswap()
+            flags = view[keys_end:flags_end]
+            views.append(flags)
+            overflow = {}
+            for line in bytes(view[flags_end:]).decode("utf-8").splitlines():
+                if line:
+                    overflow[line[1:]] = line[0] == "1"
+            if len(overflow) != overflow_count:
+                raise ValueError(f"{path} has a damaged overflow section")
+        except Exception:
+            for view in reversed(views):
+                view.release()
+            mapped.close()
+            f.close()
+            raise
+        index = cls(keys, flags, overflow, stored_token)
+        index.mapping = (f, mapped, views)
+        return index
+    def close_mapping(self):
+        if self.mapping is None:
+            return
+        f, mapped, views = self.mapping
+        self.mapping = None
+        for view in reversed(views):
+            view.release()
+        mapped.close()
+        f.close()
+    def close(self):
+        with self.lock:
+            if self.mapping is not None:
+                self.base = (array("Q"), bytearray())
+                self.delta = {}
+                self.replaced = 0
+            self.close_mapping()